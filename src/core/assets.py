@@ -11,22 +11,244 @@ from __future__ import annotations
 
 import os
 import re
+import shutil
+import tempfile
 import base64
+import hashlib
 import mimetypes
 import logging
+import mmap
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple
-from urllib.parse import urljoin, urlparse
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, List, Dict, Optional, Tuple, Union
+from urllib.parse import urljoin, urlparse, urlsplit
 
 import requests
-from bs4 import BeautifulSoup
-from typing import Optional
+import lxml.html
+from lxml import etree
+
+from src.utils.asset_cache import AssetCache, CacheEntry
+from src.utils.http import create_session
 
 
 WAYBACK_ASSET_PREFIX = "https://web.archive.org/web/{timestamp}if_/"
+DEFAULT_DOWNLOAD_WORKERS = 8
+STREAM_BUFFER_SIZE = 256 * 1024
+# Fixed pool of locks that serialize fetches of the same asset URL; URLs are
+# spread over it by hash, so its size does not grow with the run
+URL_LOCK_STRIPES = 64
+_UTF8_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+_CSS_URL_RE = re.compile(r"url\(([^)]+)\)", re.I)
+_CSS_IMPORT_RE = re.compile(r"@import\s+(?:url\()?['\"]?([^'\")\s]+)", re.I)
+# Byte-pattern twins for stylesheets read from disk: url(...) syntax is
+# ASCII, so files are scanned undecoded and only matches are decoded
+_CSS_URL_RE_B = re.compile(_CSS_URL_RE.pattern.encode('ascii'), re.I)
+_CSS_IMPORT_RE_B = re.compile(_CSS_IMPORT_RE.pattern.encode('ascii'), re.I)
+
+# One srcset image candidate: a run of non-whitespace URL (commas allowed
+# inside, e.g. data URIs; trailing commas end the candidate) followed by an
+# optional descriptor up to the next comma
+_SRCSET_RE = re.compile(r"[\s,]*(\S+?)(?:,+(?=\s|$)|(?=\s|$)\s*([^,]*)(?:,|$))")
+
+# Elements visited by AssetRewriter.rewrite_tree
+_REWRITE_XPATH = etree.XPath("//img | //source | //link[@href] | //style | //*[@style]")
+
+# <img> sources that never resolve to a file under html_dir
+_NON_LOCAL_PREFIXES = ('data:', 'http://', 'https://', '//')
+_EXT_MIME = MappingProxyType({
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.bmp': 'image/bmp',
+    '.avif': 'image/avif',
+    '.tif': 'image/tiff',
+    '.tiff': 'image/tiff',
+})
+
+# md5(css) -> extracted URLs; keyed by digest so large CSS bodies are not retained
+_CSS_URL_CACHE: "OrderedDict[bytes, Tuple[str, ...]]" = OrderedDict()
+_CSS_URL_CACHE_SIZE = 512
+_CSS_URL_CACHE_LOCK = threading.Lock()
+
+
+def parse_html(html: str):
+    """
+    Parse an HTML document with lxml; returns the root element or None.
+    The tree can be passed through collect_tree/rewrite_tree/embed_tree and
+    serialized once with serialize_html.
+    """
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # Unicode strings carrying an XML encoding declaration must be fed as bytes
+        return lxml.html.document_fromstring(html.encode('utf-8'), parser=_UTF8_HTML_PARSER)
+    except etree.ParserError:
+        return None
+
+
+def serialize_html(root) -> str:
+    """Serialize an lxml document produced by parse_html (doctype included)."""
+    return lxml.html.tostring(root.getroottree(), encoding='unicode')
+
+
+def _extract_css_urls(css_text: Union[str, bytes]) -> List[str]:
+    """
+    Return url(...) and @import references found in CSS text or raw CSS
+    bytes (data URIs skipped).
+    Results are memoized by the md5 of the CSS, so repeated boilerplate
+    <style> blocks and stylesheets are only scanned once.
+    """
+    if isinstance(css_text, bytes):
+        key = hashlib.md5(css_text).digest()
+    else:
+        key = hashlib.md5(css_text.encode('utf-8', 'surrogatepass')).digest()
+    with _CSS_URL_CACHE_LOCK:
+        cached = _CSS_URL_CACHE.get(key)
+        if cached is not None:
+            _CSS_URL_CACHE.move_to_end(key)
+            return list(cached)
+    if isinstance(css_text, bytes):
+        urls = _scan_css_urls_bytes(css_text)
+    else:
+        urls = _scan_css_urls(css_text)
+    with _CSS_URL_CACHE_LOCK:
+        _CSS_URL_CACHE[key] = tuple(urls)
+        if len(_CSS_URL_CACHE) > _CSS_URL_CACHE_SIZE:
+            _CSS_URL_CACHE.popitem(last=False)
+    return urls
+
+
+def _scan_css_urls(css_text: str) -> List[str]:
+    urls = []
+    for match in _CSS_URL_RE.finditer(css_text):
+        raw = match.group(1).strip().strip('"\'')
+        # Skip data URIs
+        if raw.lower().startswith('data:'):
+            continue
+        urls.append(raw)
+    # Also capture @import rules with or without url()
+    for match in _CSS_IMPORT_RE.finditer(css_text):
+        raw = match.group(1).strip()
+        if raw and not raw.lower().startswith('data:'):
+            urls.append(raw)
+    return urls
+
+
+def _scan_css_urls_bytes(css: bytes) -> List[str]:
+    urls = []
+    for match in _CSS_URL_RE_B.finditer(css):
+        raw = match.group(1).strip().strip(b'"\'')
+        if raw[:5].lower() == b'data:':
+            continue
+        urls.append(raw.decode('utf-8', 'ignore'))
+    for match in _CSS_IMPORT_RE_B.finditer(css):
+        raw = match.group(1).strip()
+        if raw and raw[:5].lower() != b'data:':
+            urls.append(raw.decode('utf-8', 'ignore'))
+    return urls
+
+
+@lru_cache(maxsize=4096)
+def _urljoin(base: str, ref: str) -> str:
+    """urljoin memoized on (base, ref); references repeat heavily within a page."""
+    return urljoin(base, ref)
+
+
+def ref_resolver(base_url: str) -> Callable[[str], str]:
+    """
+    Return a function resolving references against base_url, equivalent to
+    urljoin(base_url, ref). base_url is split once; absolute, protocol-
+    relative, root-relative and plain relative references are joined with
+    string operations, and anything with dot segments, a query/fragment-only
+    reference or an unusual form falls back to urljoin.
+    """
+    parts = urlsplit(base_url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return lambda ref: _urljoin(base_url, ref)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    base_dir = origin + (parts.path[:parts.path.rfind('/') + 1] if parts.path else '/')
+    scheme_prefix = parts.scheme + ':'
+
+    def resolve(ref: str) -> str:
+        if not ref or '/.' in ref or ref[0] in '.?#\\':
+            return _urljoin(base_url, ref)
+        if ref.startswith(('http://', 'https://')):
+            return ref if ref.find('/', 8) != -1 else _urljoin(base_url, ref)
+        if ref.startswith('//'):
+            return scheme_prefix + ref if ref.find('/', 2) != -1 else _urljoin(base_url, ref)
+        if ref[0] == '/':
+            return origin + ref
+        colon = ref.find(':')
+        if colon != -1 and '/' not in ref[:colon]:
+            # Has its own scheme (data:, mailto:, ...)
+            return _urljoin(base_url, ref)
+        return base_dir + ref
+
+    return resolve
+
+
+def _rel_mapping(mapping: Dict[str, str], html_dir: str) -> Dict[str, str]:
+    """Map each original URL straight to its local path relative to html_dir (posix separators)."""
+    return {url: os.path.relpath(path, html_dir).replace(os.sep, '/') for url, path in mapping.items()}
+
+
+def _rebase_css_urls(css_text: str, css_dir: str, target_dir: str) -> str:
+    """Re-point relative url(...) references from css_dir to target_dir."""
+    if os.path.abspath(css_dir) == os.path.abspath(target_dir):
+        return css_text
+
+    def repl(m):
+        raw = m.group(1).strip().strip('"\'')
+        if not raw or raw.startswith(('/', '#')) or urlparse(raw).scheme:
+            return m.group(0)
+        rel = os.path.relpath(os.path.join(css_dir, raw), target_dir).replace(os.sep, '/')
+        return f"url({rel})"
+
+    return _CSS_URL_RE.sub(repl, css_text)
+
+
+def _is_stylesheet_link(link) -> bool:
+    return 'stylesheet' in (link.get('rel') or '').lower().split()
+
+
+def _iter_srcset(srcset: str):
+    """Yield (url, descriptor) pairs from a srcset attribute value."""
+    for m in _SRCSET_RE.finditer(srcset):
+        yield m.group(1), (m.group(2) or '').strip()
+
 
+def _guess_mime(path: str) -> str:
+    """Mime type for an embedded file, from the static extension table."""
+    ext = os.path.splitext(path)[1].lower()
+    mime = _EXT_MIME.get(ext)
+    if mime is None:
+        # Uncommon extension: defer to the platform registry
+        mime = mimetypes.guess_type('x' + ext)[0] or 'application/octet-stream'
+    return mime
 
-@dataclass
+
+def _b64_file(path: str, size: int) -> str:
+    """Base64-encode a file's bytes, encoding straight from a read-only mmap."""
+    if size == 0:
+        # mmap cannot map an empty file
+        return ''
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return base64.b64encode(mm).decode('ascii')
+
+
+@dataclass(slots=True)
 class Asset:
     url: str              # Original absolute URL (post-cleaning)
     type: str             # 'image' | 'stylesheet' | 'other'
@@ -40,110 +262,95 @@ class AssetCollector:
         self.logger = logging.getLogger(__name__)
 
     def collect(self, html: str, page_url: str) -> List[Asset]:
-        soup = BeautifulSoup(html, 'lxml')
-        assets: List[Asset] = []
-
-        # Images
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src and not src.startswith('data:'):
-                abs_url = urljoin(page_url, src)
-                assets.append(Asset(url=abs_url, type='image', attr='src'))
-            # srcset candidates
-            srcset = img.get('srcset')
-            if srcset:
-                for candidate in self._parse_srcset(srcset):
-                    if candidate and not candidate.startswith('data:'):
-                        abs_cand = urljoin(page_url, candidate)
-                        assets.append(Asset(url=abs_cand, type='image', attr='srcset'))
-
-        # Stylesheets
-        for link in soup.find_all('link', rel=lambda v: v and 'stylesheet' in v):
-            href = link.get('href')
-            if href and not href.startswith('data:'):
-                abs_url = urljoin(page_url, href)
-                assets.append(Asset(url=abs_url, type='stylesheet', attr='href'))
-        # Preloads for style/font
-        for link in soup.find_all('link'):
-            rel = link.get('rel')
-            as_attr = link.get('as')
-            href = link.get('href')
-            if not href or href.startswith('data:'):
-                continue
-            rels = [r.lower() for r in rel] if isinstance(rel, list) else ([rel.lower()] if rel else [])
-            if 'preload' in rels and as_attr in ('style', 'font'):
-                abs_url = urljoin(page_url, href)
-                assets.append(Asset(url=abs_url, type='stylesheet' if as_attr=='style' else 'other', attr='href'))
-
-        # Picture/source srcset
-        for source in soup.find_all('source'):
-            srcset = source.get('srcset')
-            if srcset:
-                for candidate in self._parse_srcset(srcset):
-                    if candidate and not candidate.startswith('data:'):
-                        abs_cand = urljoin(page_url, candidate)
-                        assets.append(Asset(url=abs_cand, type='image', attr='srcset'))
-
-        # Inline style attributes url(...)
-        for el in soup.find_all(style=True):
-            style = el.get('style', '')
-            for css_url in self._extract_css_urls(style):
-                if css_url and not css_url.startswith('data:'):
-                    abs_url = urljoin(page_url, css_url)
-                    assets.append(Asset(url=abs_url, type='image', attr='style'))
-
-        # <style> blocks url(...)
-        for style_tag in soup.find_all('style'):
-            css_text = style_tag.get_text() or ''
-            for css_url in self._extract_css_urls(css_text):
-                if css_url and not css_url.startswith('data:'):
-                    abs_url = urljoin(page_url, css_url)
-                    assets.append(Asset(url=abs_url, type='image', attr='style'))
-
-        # De-duplicate by URL
+        root = parse_html(html)
+        if root is None:
+            return []
+        return self.collect_tree(root, page_url)
+
+    def collect_tree(self, root, page_url: str) -> List[Asset]:
+        """Collect assets from an already-parsed lxml document (see parse_html)."""
+        # De-duplicate by URL while walking (last occurrence wins, first position kept)
         dedup: Dict[str, Asset] = {}
-        for a in assets:
-            dedup[a.url] = a
+
+        def add(url: Optional[str], type_: str, attr: str) -> None:
+            if url and not url.startswith('data:'):
+                abs_url = _urljoin(page_url, url)
+                dedup[abs_url] = Asset(url=abs_url, type=type_, attr=attr)
+
+        # Single pass over the tree, dispatching on tag name
+        for el in root.iter():
+            tag = el.tag
+            if not isinstance(tag, str):
+                continue  # comments / processing instructions
+            if tag == 'img':
+                add(el.get('src'), 'image', 'src')
+                srcset = el.get('srcset')
+                if srcset:
+                    for candidate in self._parse_srcset(srcset):
+                        add(candidate, 'image', 'srcset')
+            elif tag == 'link':
+                href = el.get('href')
+                if href and not href.startswith('data:'):
+                    rels = (el.get('rel') or '').lower().split()
+                    if 'stylesheet' in rels:
+                        add(href, 'stylesheet', 'href')
+                    # Preloads for style/font
+                    as_attr = el.get('as')
+                    if 'preload' in rels and as_attr in ('style', 'font'):
+                        add(href, 'stylesheet' if as_attr == 'style' else 'other', 'href')
+            elif tag == 'source':
+                # Picture/source srcset
+                srcset = el.get('srcset')
+                if srcset:
+                    for candidate in self._parse_srcset(srcset):
+                        add(candidate, 'image', 'srcset')
+            elif tag == 'style':
+                # <style> blocks url(...)
+                for css_url in self._extract_css_urls(el.text or ''):
+                    add(css_url, 'image', 'style')
+
+            # Inline style attributes url(...)
+            style = el.get('style')
+            if style:
+                for css_url in self._extract_css_urls(style):
+                    add(css_url, 'image', 'style')
+
         return list(dedup.values())
 
     def _extract_css_urls(self, css_text: str) -> List[str]:
-        urls = []
-        for match in re.finditer(r"url\(([^)]+)\)", css_text, flags=re.I):
-            raw = match.group(1).strip().strip('"\'')
-            # Skip data URIs
-            if raw.lower().startswith('data:'):
-                continue
-            urls.append(raw)
-        # Also capture @import rules with or without url()
-        for match in re.finditer(r"@import\s+(?:url\()?['\"]?([^'\")\s]+)", css_text, flags=re.I):
-            raw = match.group(1).strip()
-            if raw and not raw.lower().startswith('data:'):
-                urls.append(raw)
-        return urls
+        return _extract_css_urls(css_text)
 
     def _parse_srcset(self, srcset: str) -> List[str]:
-        # srcset entries are comma-separated; each entry has URL + descriptor
-        candidates = []
-        for part in srcset.split(','):
-            item = part.strip()
-            if not item:
-                continue
-            url_only = item.split()[0]
-            candidates.append(url_only)
-        return candidates
+        return [url for url, _ in _iter_srcset(srcset)]
 
 
 class AssetDownloader:
-    def __init__(self, request_delay: float = 1.5, max_retries: int = 2, rate_limiter=None, cache_dir: Optional[str] = None):
+    def __init__(self, request_delay: float = 1.5, max_retries: int = 2, rate_limiter=None, cache_dir: Optional[str] = None,
+                 max_workers: int = DEFAULT_DOWNLOAD_WORKERS, revalidate: bool = False,
+                 session: Optional[requests.Session] = None):
         self.logger = logging.getLogger(__name__)
         self.request_delay = request_delay
         self.max_retries = max_retries
         self.rate_limiter = rate_limiter
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Archaic/2.0 (AssetDownloader)'
-        })
+        self.max_workers = max(1, max_workers)
+        # A shared session is owned by the caller; otherwise size our own pool
+        # to the worker count so threads reuse keep-alive connections
+        self._owns_session = session is None
+        self.session = session if session is not None else create_session(self.max_workers)
+        self.headers = {'User-Agent': 'Archaic/2.0 (AssetDownloader)'}
         self.cache_dir = cache_dir
+        self.cache = AssetCache(cache_dir) if cache_dir else None
+        # Revalidate cache hits with a conditional GET (If-None-Match /
+        # If-Modified-Since) instead of trusting them outright
+        self.revalidate = revalidate
+        self._url_locks = tuple(threading.Lock() for _ in range(URL_LOCK_STRIPES))
+
+    def close(self) -> None:
+        """Release the cache index and, unless shared, the HTTP session."""
+        if self.cache is not None:
+            self.cache.close()
+        if self._owns_session:
+            self.session.close()
 
     def _wayback_url(self, asset_url: str, timestamp: str) -> str:
         return WAYBACK_ASSET_PREFIX.format(timestamp=timestamp) + asset_url
@@ -151,56 +358,144 @@ class AssetDownloader:
     def download(self, assets: List[Asset], dest_dir: str, timestamp: str) -> Dict[str, str]:
         """
         Download assets via Wayback for the given capture timestamp.
+        Requests are dispatched over a thread pool sharing one session; the
+        rate limiter (if any) still gates every request.
         Returns a mapping of original URL -> local file path.
         """
         os.makedirs(dest_dir, exist_ok=True)
         mapping: Dict[str, str] = {}
+        if not assets:
+            return mapping
+        jobs = []
+        dirs = set()
         for a in assets:
-            wayback = self._wayback_url(a.url, timestamp)
-            local_rel = self._local_name(a.url)
-            local_path = os.path.join(dest_dir, local_rel)
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            try:
-                if self.rate_limiter:
-                    self.rate_limiter.acquire()
-                # Check cache
-                cached_path = self._cached_or_download(a.url, wayback)
-                # Copy from cache (or downloaded temp) to page-local path
-                if cached_path:
-                    import shutil
-                    shutil.copy2(cached_path, local_path)
+            local_path = os.path.join(dest_dir, self._local_name(a.url))
+            jobs.append((a, self._wayback_url(a.url, timestamp), local_path))
+            dirs.add(os.path.dirname(local_path))
+        # One makedirs per distinct directory rather than one per asset
+        for d in dirs:
+            os.makedirs(d, exist_ok=True)
+
+        workers = min(self.max_workers, len(jobs))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(self._fetch_one, a, wayback, local_path): a for a, wayback, local_path in jobs}
+            for fut in as_completed(futures):
+                a = futures[fut]
+                try:
+                    local_path = fut.result()
+                except Exception as e:
+                    self.logger.warning(f"Failed to download asset: {a.url} ({e})")
+                    continue
+                if local_path:
                     mapping[a.url] = local_path
-            except Exception as e:
-                self.logger.warning(f"Failed to download asset: {a.url} ({e})")
         return mapping
 
-    def _cached_or_download(self, original_url: str, wayback_url: str) -> Optional[str]:
-        """Return path to cached file, downloading into cache if necessary."""
-        if not self.cache_dir:
-            # No cache configured; fetch directly
-            resp = self.session.get(wayback_url, timeout=30)
-            resp.raise_for_status()
-            # Store temporarily alongside cache_dir semantics: create temp in memory
-            # For simplicity return a temp path in cache_dir-like behavior
-            import tempfile
+    def _fetch_one(self, asset: Asset, wayback_url: str, local_path: str) -> Optional[str]:
+        """
+        Fetch a single asset (via cache when configured) into local_path.
+        The parent directory must already exist (download() creates them).
+        """
+        if self.cache is None:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            downloaded = self._cached_or_download(asset.url, wayback_url)
+            if not downloaded:
+                return None
+            shutil.move(downloaded, local_path)
+            return local_path
+        # Pages processed concurrently often share assets; holding the URL's
+        # lock means the first fetch fills the cache and the others hit it
+        with self._url_lock(asset.url):
+            entry = self.cache.lookup(asset.url)
+            if entry is not None and not (self.revalidate and (entry.etag or entry.last_modified)):
+                # Cache hit: no request is made, so no rate limiter token is spent
+                cached = entry.path
+            else:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire()
+                cached = self._cached_or_download(asset.url, wayback_url, entry)
+        if not cached:
+            return None
+        # Link/copy from cache to page-local path
+        self._place_from_cache(cached, local_path)
+        return local_path
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        """The lock striped to url (unrelated URLs may occasionally share one)."""
+        return self._url_locks[hash(url) % URL_LOCK_STRIPES]
+
+    def _place_from_cache(self, cached_path: str, local_path: str) -> None:
+        """
+        Hard-link a cached file into the page's asset directory, falling back
+        to a copy. Stylesheets are always copied because the deep CSS pass
+        rewrites them in place, which would otherwise modify the cache entry.
+        """
+        if os.path.lexists(local_path):
+            os.unlink(local_path)
+        if not local_path.lower().endswith('.css'):
+            try:
+                os.link(cached_path, local_path)
+                return
+            except OSError:
+                pass
+        shutil.copy2(cached_path, local_path)
+
+    def _cached_or_download(self, original_url: str, wayback_url: str,
+                            entry: Optional[CacheEntry] = None) -> Optional[str]:
+        """
+        Return path to cached file, downloading into cache if necessary.
+        When a cache entry is given it is revalidated with a conditional GET
+        and kept as-is on 304 Not Modified.
+        """
+        if self.cache is None:
+            # No cache configured; fetch directly into a temp file that the
+            # caller moves into place
             fd, tmp = tempfile.mkstemp(prefix='asset_', suffix=self._ext_from_url(original_url))
-            with os.fdopen(fd, 'wb') as f:
-                f.write(resp.content)
+            os.close(fd)
+            try:
+                self._stream_to_file(wayback_url, tmp)
+            except Exception:
+                os.unlink(tmp)
+                raise
             return tmp
-        os.makedirs(self.cache_dir, exist_ok=True)
-        cache_path = os.path.join(self.cache_dir, self._cache_name(original_url))
-        if os.path.exists(cache_path):
-            return cache_path
-        resp = self.session.get(wayback_url, timeout=30)
-        resp.raise_for_status()
-        with open(cache_path, 'wb') as f:
-            f.write(resp.content)
+        conditional = {}
+        if entry is not None:
+            if entry.etag:
+                conditional['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                conditional['If-Modified-Since'] = entry.last_modified
+        cache_path = self.cache.path_for(original_url)
+        # Write to a sibling temp file and rename so a failed transfer never
+        # leaves a truncated entry in the cache
+        tmp = f"{cache_path}.{threading.get_ident()}.part"
+        try:
+            headers = self._stream_to_file(wayback_url, tmp, conditional)
+            if headers is None:
+                return entry.path
+            os.replace(tmp, cache_path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        self.cache.store(original_url, cache_path,
+                         etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'))
         return cache_path
 
-    def _cache_name(self, url: str) -> str:
-        import hashlib
-        h = hashlib.sha1(url.encode('utf-8')).hexdigest()
-        return h + self._ext_from_url(url)
+    def _stream_to_file(self, url: str, path: str, conditional: Optional[Dict[str, str]] = None):
+        """
+        GET url and stream the body to path without materializing it in memory.
+        Returns the response headers, or None when a conditional request came
+        back 304 Not Modified (nothing is written).
+        """
+        headers = {**self.headers, **conditional} if conditional else self.headers
+        with self.session.get(url, timeout=30, stream=True, headers=headers) as resp:
+            if conditional and resp.status_code == 304:
+                return None
+            resp.raise_for_status()
+            # Let urllib3 undo gzip/deflate transfer encoding on the raw stream
+            resp.raw.decode_content = True
+            with open(path, 'wb', buffering=STREAM_BUFFER_SIZE) as f:
+                shutil.copyfileobj(resp.raw, f, length=STREAM_BUFFER_SIZE)
+            return resp.headers
 
     def _ext_from_url(self, url: str) -> str:
         p = urlparse(url)
@@ -226,60 +521,66 @@ class AssetRewriter:
         Rewrite HTML references to point to local paths relative to html_dir.
         assets_relroot: e.g., 'assets/slug'
         """
-        soup = BeautifulSoup(html, 'lxml')
-
-        def rel_from_abs(local_abs: str) -> str:
-            rel = os.path.relpath(local_abs, html_dir)
-            # Normalize to posix separators for HTML
-            return rel.replace(os.sep, '/')
-
-        # Images
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src and src in mapping:
-                img['src'] = rel_from_abs(mapping[src])
+        root = parse_html(html)
+        if root is None:
+            return html
+        self.rewrite_tree(root, page_url, mapping, html_dir, assets_relroot)
+        return serialize_html(root)
 
-        # Stylesheets
-        for link in soup.find_all('link', rel=lambda v: v and 'stylesheet' in v):
-            href = link.get('href')
-            if href and href in mapping:
-                link['href'] = rel_from_abs(mapping[href])
-
-        # Inline style attributes
-        for el in soup.find_all(style=True):
-            style = el.get('style', '')
-            new_style = self._rewrite_css_urls(style, mapping, html_dir)
-            if new_style != style:
-                el['style'] = new_style
-
-        # <style> blocks
-        for style_tag in soup.find_all('style'):
-            css_text = style_tag.get_text() or ''
-            new_css = self._rewrite_css_urls(css_text, mapping, html_dir)
-            if new_css != css_text:
-                style_tag.string = new_css
-
-        # Rewrite srcset attributes
-        for tag in soup.find_all(['img', 'source']):
-            srcset = tag.get('srcset')
-            if not srcset:
-                continue
-            parts = []
-            for part in srcset.split(','):
-                item = part.strip()
-                if not item:
-                    continue
-                tokens = item.split()
-                url_only = tokens[0]
-                descriptor = ' '.join(tokens[1:]) if len(tokens) > 1 else ''
-                if url_only in mapping:
-                    rel = rel_from_abs(mapping[url_only])
-                    parts.append((rel + (f" {descriptor}" if descriptor else '')).strip())
-                else:
-                    parts.append(item)
-            tag['srcset'] = ', '.join(parts)
-
-        return str(soup)
+    def rewrite_tree(self, root, page_url: str, mapping: Dict[str, str], html_dir: str, assets_relroot: str) -> None:
+        """
+        In-place variant of rewrite_html for a document parsed with parse_html.
+        Rewrites img/source/link references and CSS url(...) references in
+        <style> blocks and style attributes; url(...) text anywhere else
+        (scripts, <pre>, body text) is left alone.
+        """
+        rel_mapping = _rel_mapping(mapping, html_dir)
+
+        def css_repl(m):
+            rel = rel_mapping.get(m.group(1).strip().strip('"\''))
+            return m.group(0) if rel is None else f"url({rel})"
+
+        def srcset_repl(m):
+            # Swap only the URL span of the candidate; separators and
+            # descriptors are kept verbatim
+            url_only = m.group(1)
+            rel = rel_mapping.get(url_only)
+            if rel is None:
+                return m.group(0)
+            start = m.start(1) - m.start()
+            return m.group(0)[:start] + rel + m.group(0)[start + len(url_only):]
+
+        # One XPath node-set (document order, no duplicates) covering every
+        # element that can carry a rewritable reference
+        for el in _REWRITE_XPATH(root):
+            tag = el.tag
+            if tag == 'img' or tag == 'source':
+                if tag == 'img':
+                    rel = rel_mapping.get(el.get('src'))
+                    if rel is not None:
+                        el.set('src', rel)
+                srcset = el.get('srcset')
+                if srcset:
+                    new_srcset = _SRCSET_RE.sub(srcset_repl, srcset)
+                    if new_srcset != srcset:
+                        el.set('srcset', new_srcset)
+            elif tag == 'link':
+                rel = rel_mapping.get(el.get('href'))
+                if rel is not None and _is_stylesheet_link(el):
+                    el.set('href', rel)
+            elif tag == 'style':
+                css_text = el.text
+                if css_text:
+                    new_css = _CSS_URL_RE.sub(css_repl, css_text)
+                    if new_css != css_text:
+                        el.text = new_css
+
+            # Inline style attributes (any element; the node-set lists each once)
+            style = el.get('style')
+            if style:
+                new_style = _CSS_URL_RE.sub(css_repl, style)
+                if new_style != style:
+                    el.set('style', new_style)
 
     def _rewrite_css_urls(self, css_text: str, mapping: Dict[str, str], html_dir: str) -> str:
         def repl(m):
@@ -289,33 +590,43 @@ class AssetRewriter:
                 return f"url({rel})"
             return m.group(0)
 
-        return re.sub(r"url\(([^)]+)\)", repl, css_text, flags=re.I)
+        return _CSS_URL_RE.sub(repl, css_text)
 
     def embed_single_file(self, html: str, mapping: Dict[str, str], html_dir: str, size_limit: int = 1_500_000) -> str:
         """
         Convert HTML into a single-file by embedding images and stylesheets
         as data URIs (for stylesheets, inline as <style> with content).
         """
-        soup = BeautifulSoup(html, 'lxml')
-
+        root = parse_html(html)
+        if root is None:
+            return html
+        self.embed_tree(root, mapping, html_dir, size_limit)
+        return serialize_html(root)
+
+    def embed_tree(self, root, mapping: Dict[str, str], html_dir: str, size_limit: int = 1_500_000) -> None:
+        """In-place variant of embed_single_file for a document parsed with parse_html."""
         # Embed images
-        for img in soup.find_all('img'):
+        for img in root.iter('img'):
             src = img.get('src')
             if not src:
                 continue
             abs_path = mapping.get(src)
             if not abs_path:
+                # Already-embedded or remote (unmapped) sources have no local file
+                if src.startswith(_NON_LOCAL_PREFIXES):
+                    continue
                 # Resolve relative to HTML directory
                 abs_path = os.path.abspath(os.path.join(html_dir, src))
-            if os.path.exists(abs_path) and os.path.getsize(abs_path) <= size_limit:
-                mime, _ = mimetypes.guess_type(abs_path)
-                mime = mime or 'application/octet-stream'
-                with open(abs_path, 'rb') as f:
-                    b64 = base64.b64encode(f.read()).decode('ascii')
-                img['src'] = f"data:{mime};base64,{b64}"
+            try:
+                size = os.stat(abs_path).st_size
+            except OSError:
+                continue
+            if size > size_limit:
+                continue
+            img.set('src', ''.join(('data:', _guess_mime(abs_path), ';base64,', _b64_file(abs_path, size))))
 
         # Inline stylesheets
-        for link in list(soup.find_all('link', rel=lambda v: v and 'stylesheet' in v)):
+        for link in [el for el in root.iter('link') if _is_stylesheet_link(el)]:
             href = link.get('href')
             if not href:
                 continue
@@ -327,17 +638,48 @@ class AssetRewriter:
             try:
                 with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
                     css = f.read()
-                style_tag = soup.new_tag('style')
-                style_tag.string = css
-                link.replace_with(style_tag)
+                style_tag = lxml.html.Element('style')
+                # Relative url(...)s were relative to the stylesheet; inline
+                # they resolve against the document
+                style_tag.text = _rebase_css_urls(css, os.path.dirname(abs_path), html_dir)
+                style_tag.tail = link.tail
+                link.getparent().replace(link, style_tag)
             except Exception:
                 continue
 
-        return str(soup)
-
     # Deep CSS pass: download CSS dependencies and rewrite CSS files
-    def extract_css_dependencies(self, css_content: str) -> List[str]:
-        return [u for u in self._extract_css_urls(css_content) if not u.lower().startswith('data:')]
+    def extract_css_dependencies(self, css_content: Union[str, bytes]) -> List[str]:
+        return _extract_css_urls(css_content)
+
+    def localize_css(self, css_text: Union[str, bytes], css_url: str, mapping: Dict[str, str],
+                     css_dir: str) -> Union[str, bytes]:
+        """
+        Rewrite url(...) references in a stylesheet to local paths relative to
+        the stylesheet's own directory (css_dir). References are resolved
+        against css_url before the mapping lookup, so relative and
+        root-relative URLs are localized too. Raw bytes are rewritten
+        without decoding the stylesheet and bytes are returned.
+        """
+        resolve = ref_resolver(css_url)
+
+        def local_ref(raw: str) -> Optional[str]:
+            local = mapping.get(resolve(raw))
+            if local is None:
+                return None
+            return f"url({os.path.relpath(local, css_dir).replace(os.sep, '/')})"
+
+        if isinstance(css_text, bytes):
+            def repl_bytes(m):
+                ref = local_ref(m.group(1).strip().strip(b'"\'').decode('utf-8', 'ignore'))
+                return m.group(0) if ref is None else ref.encode('utf-8')
+
+            return _CSS_URL_RE_B.sub(repl_bytes, css_text)
+
+        def repl(m):
+            ref = local_ref(m.group(1).strip().strip('"\''))
+            return m.group(0) if ref is None else ref
+
+        return _CSS_URL_RE.sub(repl, css_text)
 
     def rewrite_css_file(self, css_path: str, mapping: Dict[str, str], html_dir: str) -> None:
         try:
@@ -345,7 +687,7 @@ class AssetRewriter:
                 css = f.read()
             new_css = self._rewrite_css_urls(css, mapping, html_dir)
             if new_css != css:
-                with open(css_path, 'w', encoding='utf-8') as f:
-                    f.write(new_css)
+                with open(css_path, 'wb', buffering=STREAM_BUFFER_SIZE) as f:
+                    f.write(new_css.encode('utf-8'))
         except Exception as e:
             self.logger.warning(f"Failed to rewrite CSS file {css_path}: {e}")
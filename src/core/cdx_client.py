@@ -5,12 +5,56 @@ This module handles communication with the Internet Archive's CDX Server API
 to discover all captured URLs matching a specific path pattern.
 """
 
+import gzip
+import hashlib
+import json
+import os
+import re
 import requests
+import tempfile
 import time
-from typing import List, Dict, Optional, Set, Tuple
-from urllib.parse import urlparse, urljoin
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from urllib.parse import urlparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from src.utils.validators import create_wildcard_patterns, normalize_host
+from src.utils.http import create_session
+from src.utils.rate_limiter import TokenBucket
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - optional speedup
+    _json_loads = json.loads
+
+DISCOVERY_STATUS = '200'
+DISCOVERY_MIMETYPE = 'text/html'
+# How long a cached discovery result is reused before CDX is queried again
+DEFAULT_DISCOVERY_CACHE_TTL = 24 * 3600
+
+# Concurrent page requests per pattern when CDX reports a page count
+MAX_PAGE_WORKERS = 4
+# Safety limit on pages fetched for one pattern
+MAX_PAGES = 1000
+
+_SCHEME_RE = re.compile(r'^https?://', re.I)
+_DEFAULT_PORT_RE = re.compile(r':(?:80|443)$')
+
+
+@dataclass(slots=True)
+class CDXRecord:
+    """One capture returned by the CDX API."""
+    url: str            # Original URL
+    timestamp: str      # Capture timestamp (YYYYMMDDhhmmss)
+    wayback_url: str    # Full Wayback Machine URL for the capture
+    status_code: str = DISCOVERY_STATUS
+    mime_type: str = DISCOVERY_MIMETYPE
+
+
+def _wayback_url(timestamp: str, original_url: str) -> str:
+    return f"https://web.archive.org/web/{timestamp}/{original_url}"
+
 
 class CDXClient:
     """
@@ -22,34 +66,52 @@ class CDXClient:
     
     CDX_BASE_URL = "http://web.archive.org/cdx/search/cdx"
     
-    def __init__(self, request_delay: float = 1.0):
+    def __init__(self, request_delay: float = 1.0, session: Optional[requests.Session] = None,
+                 cache_dir: Optional[str] = None, cache_ttl: float = DEFAULT_DISCOVERY_CACHE_TTL,
+                 rate_limiter=None):
         """
         Initialize the CDX client.
         
         Args:
             request_delay: Delay in seconds between API requests to be respectful
+            session: Optional shared session (see src.utils.http); when given,
+                the caller owns it and close() leaves it open
+            cache_dir: Directory for cached discovery results (None disables)
+            cache_ttl: Maximum age in seconds of a cached discovery result
+            rate_limiter: Optional shared limiter (e.g. TokenBucket). Without
+                one, a private limiter allowing one request per request_delay
+                is used, so the concurrent pattern and page threads together
+                keep that pace
         """
         self.request_delay = request_delay
+        if rate_limiter is None and request_delay > 0:
+            rate_limiter = TokenBucket(rate_per_sec=1.0 / request_delay, burst=1, jitter_ms=0)
+        self.rate_limiter = rate_limiter
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
         self.logger = logging.getLogger(__name__)
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Archaic/2.0 (Archival Web Scraper; contact: user@example.com)'
-        })
+        self._owns_session = session is None
+        self.session = session if session is not None else create_session()
+        # Sent per request so a shared session's defaults are left untouched
+        self.headers = {
+            'User-Agent': 'Archaic/2.0 (Archival Web Scraper; contact: user@example.com)',
+        }
     
-    def discover_urls(self, base_url: str) -> List[Dict[str, str]]:
+    def discover_urls(self, base_url: str, force_refresh: bool = False) -> List[CDXRecord]:
         """
         Discover all unique URLs captured by the Wayback Machine for a given base path.
         
         Args:
             base_url: The base URL pattern to search for (e.g., "example.com/articles/")
+            force_refresh: Query CDX even if a fresh cached result exists
         
         Returns:
-            List of dictionaries containing URL metadata:
-            - 'url': The original URL
-            - 'timestamp': The capture timestamp
-            - 'wayback_url': The full Wayback Machine URL for accessing the page
-            - 'status_code': HTTP status code of the capture
-            - 'mime_type': MIME type of the captured content
+            List of CDXRecord (latest capture per normalized URL) with:
+            - url: The original URL
+            - timestamp: The capture timestamp
+            - wayback_url: The full Wayback Machine URL for accessing the page
+            - status_code: HTTP status code of the capture
+            - mime_type: MIME type of the captured content
         
         Raises:
             requests.RequestException: If the CDX API request fails
@@ -62,48 +124,33 @@ class CDXClient:
         if not ok:
             raise ValueError(f"Invalid base URL: {err}")
 
-        # Build CDX API base parameters
-        base_params = {
-            'output': 'json',
-            'fl': 'timestamp,original,statuscode,mimetype',
-            'filter': ['statuscode:200', 'mimetype:text/html'],
-            'collapse': 'original',
-            'sort': 'reverse',
-            'limit': 10000
-        }
+        cache_path = self._discovery_cache_path(base_url, patterns)
+        if cache_path and not force_refresh:
+            cached = self._load_discovery_cache(cache_path)
+            if cached is not None:
+                self.logger.info(f"Using cached discovery result ({len(cached)} URLs)")
+                return cached
+
+        base_params = self._discovery_params()
         
         try:
-            merged: Dict[str, Dict[str, str]] = {}
-            for pattern in patterns:
-                params = dict(base_params)
-                params['url'] = pattern
-                params['showResumeKey'] = 'true'
-
-                # Page through results using resumeKey if present
-                resume_key: Optional[str] = None
-                page_count = 0
-                while True:
-                    if resume_key:
-                        params['resumeKey'] = resume_key
-                    else:
-                        params.pop('resumeKey', None)
-                    response = self._make_request(params)
-                    records, resume_key = self._parse_cdx_json_with_resume(response)
-                    page_count += 1
-                    # Merge by normalized original (scheme+host normalized)
-                    for rec in records:
-                        norm_ok, norm_url, _ = normalize_host(rec['url'])
-                        key = norm_url if norm_ok else rec['url']
-                        if key not in merged or rec['timestamp'] > merged[key]['timestamp']:
-                            merged[key] = rec
-                    if not resume_key:
-                        break
-                    # Safety: avoid pathological loops
-                    if page_count > 1000:
-                        self.logger.warning("CDX paging aborted after 1000 pages (safety limit)")
-                        break
+            # Patterns are independent queries: page each one on its own
+            # thread (each may fan out further over numbered pages) and merge
+            # once all have finished
+            merged: Dict[str, CDXRecord] = {}
+            if len(patterns) > 1:
+                with ThreadPoolExecutor(max_workers=len(patterns)) as ex:
+                    per_pattern = list(ex.map(lambda p: self._page_pattern(p, base_params), patterns))
+            else:
+                per_pattern = [self._page_pattern(p, base_params) for p in patterns]
+            for found in per_pattern:
+                for key, rec in found.items():
+                    if key not in merged or rec.timestamp > merged[key].timestamp:
+                        merged[key] = rec
             urls = list(merged.values())
             self.logger.info(f"Discovered {len(urls)} unique URLs across patterns")
+            if cache_path:
+                self._save_discovery_cache(cache_path, urls)
             return urls
             
         except requests.RequestException as e:
@@ -113,6 +160,153 @@ class CDXClient:
             self.logger.error(f"Invalid response from CDX API: {e}")
             raise
     
+    def _discovery_params(self) -> Dict:
+        """CDX query parameters shared by every discovery pattern."""
+        # Only timestamp/original are requested: the filters already pin
+        # status and mimetype, so those columns would be constant
+        # Plain-text (cdx) output: one space-separated row per line, parsed
+        # as it streams in rather than materializing a JSON array
+        return {
+            'fl': 'timestamp,original',
+            'filter': [f'statuscode:{DISCOVERY_STATUS}', f'mimetype:{DISCOVERY_MIMETYPE}'],
+            'collapse': 'original',
+            'sort': 'reverse',
+            'limit': 10000
+        }
+
+    def _discovery_cache_path(self, base_url: str, patterns: List[str]) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        key = hashlib.sha1(f"{base_url}|{','.join(patterns)}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def _load_discovery_cache(self, path: str) -> Optional[List[CDXRecord]]:
+        """Return cached records if path exists and is younger than cache_ttl."""
+        try:
+            if time.time() - os.stat(path).st_mtime > self.cache_ttl:
+                return None
+            with gzip.open(path, 'rb') as f:
+                rows = _json_loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable discovery cache {path}: {e}")
+            return None
+        return [CDXRecord(original, ts, _wayback_url(ts, original)) for ts, original in rows]
+
+    def _save_discovery_cache(self, path: str, records: List[CDXRecord]) -> None:
+        """Write records as gzipped [timestamp, original] rows via temp file + rename."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            rows = [[rec.timestamp, rec.url] for rec in records]
+            fd, tmp = tempfile.mkstemp(prefix='cdx_', suffix='.part', dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                    f.write(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        except OSError as e:
+            self.logger.warning(f"Could not write discovery cache {path}: {e}")
+
+    def _page_pattern(self, pattern: str, base_params: Dict) -> Dict[str, CDXRecord]:
+        """
+        Fetch every page of results for one CDX pattern.
+
+        Returns the latest capture per normalized original URL.
+        """
+        found: Dict[str, CDXRecord] = {}
+        for records in self._iter_pattern_pages(pattern, base_params):
+            self._merge_latest(found, records)
+        return found
+
+    def _iter_pattern_pages(self, pattern: str, base_params: Dict) -> Iterator[List[CDXRecord]]:
+        """
+        Yield the records of each CDX result page for one pattern.
+
+        The first page is requested with showResumeKey; when everything fits
+        in it (no resume key) that single request is all the pattern costs.
+        Otherwise, if CDX reports more than one numbered page (showNumPages)
+        those independent pages are fetched concurrently, a few at a time;
+        failing that, paging continues sequentially by resumeKey.
+        """
+        params = dict(base_params)
+        params['url'] = pattern
+
+        with self._make_request({**params, 'showResumeKey': 'true'}, stream=True) as response:
+            records, resume_key = self._parse_cdx_text_with_resume(response.iter_lines())
+        if not resume_key:
+            yield records
+            return
+
+        num_pages = self._num_pages(params)
+        if num_pages is None or num_pages <= 1:
+            yield records
+            yield from self._iter_resume_pages(pattern, params, resume_key)
+            return
+        # Numbered pages cover the whole result set, first page included
+        if num_pages > MAX_PAGES:
+            self.logger.warning(f"CDX reports {num_pages} pages for {pattern}; only the first {MAX_PAGES} are fetched (safety limit)")
+            num_pages = MAX_PAGES
+        paged = {k: v for k, v in params.items() if k != 'limit'}
+
+        def fetch(page: int) -> List[CDXRecord]:
+            with self._make_request({**paged, 'page': page}, stream=True) as response:
+                return self._parse_cdx_text_with_resume(response.iter_lines())[0]
+
+        # Pages are submitted in windows so a consumer that stops early does
+        # not leave the whole range queued
+        with ThreadPoolExecutor(max_workers=min(num_pages, MAX_PAGE_WORKERS)) as ex:
+            for start in range(0, num_pages, MAX_PAGE_WORKERS):
+                yield from ex.map(fetch, range(start, min(start + MAX_PAGE_WORKERS, num_pages)))
+
+    def _num_pages(self, params: Dict) -> Optional[int]:
+        """Ask CDX how many pages params spans; None if it cannot say."""
+        try:
+            with self._make_request({**params, 'showNumPages': 'true'}) as response:
+                return max(0, int(response.text.strip()))
+        except (requests.RequestException, ValueError) as e:
+            self.logger.debug(f"CDX page count unavailable, paging by resumeKey: {e}")
+            return None
+
+    def _merge_latest(self, found: Dict[str, CDXRecord], records: List[CDXRecord]) -> None:
+        """Keep the newest capture per normalized original URL."""
+        for rec in records:
+            norm_ok, norm_url, _ = normalize_host(rec.url)
+            key = norm_url if norm_ok else rec.url
+            prev = found.get(key)
+            if prev is None or rec.timestamp > prev.timestamp:
+                found[key] = rec
+
+    def _iter_resume_pages(self, pattern: str, params: Dict,
+                           resume_key: Optional[str] = None) -> Iterator[List[CDXRecord]]:
+        """
+        Yield one pattern's result pages sequentially, following resumeKey
+        (starting after resume_key when one is given, i.e. after a page the
+        caller already has). With sort=reverse the index comes back
+        newest-first and later resume pages are older.
+        """
+        params = dict(params)
+        params['showResumeKey'] = 'true'
+
+        page_count = 1 if resume_key else 0
+        while True:
+            if resume_key:
+                params['resumeKey'] = resume_key
+            else:
+                params.pop('resumeKey', None)
+            with self._make_request(params, stream=True) as response:
+                records, resume_key = self._parse_cdx_text_with_resume(response.iter_lines())
+            page_count += 1
+            yield records
+            if not resume_key:
+                break
+            # Safety: avoid pathological loops
+            if page_count > MAX_PAGES:
+                self.logger.warning(f"CDX paging for {pattern} aborted after {MAX_PAGES} pages (safety limit)")
+                break
+
     def _prepare_url_pattern(self, base_url: str) -> str:
         """
         Prepare the URL pattern for CDX API search.
@@ -130,38 +324,35 @@ class CDXClient:
             raise ValueError("Base URL cannot be empty")
         
         # Add protocol if missing
-        if not base_url.startswith(('http://', 'https://')):
+        if not _SCHEME_RE.match(base_url):
             base_url = 'https://' + base_url
 
         # Parse the URL to validate it
         parsed = urlparse(base_url)
-        if not parsed.netloc:
+        host = parsed.netloc
+        if not host:
             raise ValueError(f"Invalid URL: {base_url}")
 
         # Create wildcard pattern for CDX search (http* to include both schemes)
         path = parsed.path or '/'
-        if not path.endswith('*'):
-            if path.endswith('/'):
-                path = path + '*'
-            else:
-                path = path + '/*'
+        if path[-1] != '*':
+            path += '*' if path[-1] == '/' else '/*'
         # Normalize host (strip default ports)
-        host = parsed.netloc
-        if host.endswith(':80'):
-            host = host[:-3]
-        if host.endswith(':443'):
-            host = host[:-4]
+        m = _DEFAULT_PORT_RE.search(host)
+        if m:
+            host = host[:m.start()]
         pattern = f"http*://{host}{path}"
         
         self.logger.debug(f"URL pattern prepared: {pattern}")
         return pattern
     
-    def _make_request(self, params: Dict) -> requests.Response:
+    def _make_request(self, params: Dict, stream: bool = False) -> requests.Response:
         """
         Make a rate-limited request to the CDX API.
         
         Args:
             params: Query parameters for the CDX API
+            stream: Leave the body unread so it can be consumed incrementally
             
         Returns:
             Response object from the API
@@ -169,128 +360,48 @@ class CDXClient:
         Raises:
             requests.RequestException: If the request fails
         """
-        # Respectful delay before request
-        if self.request_delay > 0:
-            time.sleep(self.request_delay)
+        # Respectful pacing shared by every thread using this client
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
         
         self.logger.debug(f"Making CDX API request with params: {params}")
         
-        response = self.session.get(self.CDX_BASE_URL, params=params, timeout=30)
-        response.raise_for_status()
+        response = self.session.get(self.CDX_BASE_URL, params=params, headers=self.headers,
+                                    timeout=30, stream=stream)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
 
         return response
     
-    def _parse_cdx_response(self, data: List) -> List[Dict[str, str]]:
-        """
-        Parse the JSON response from the CDX API.
-        
-        Args:
-            data: Raw JSON data from CDX API
-            
-        Returns:
-            List of parsed URL records
-            
-        Raises:
-            ValueError: If the response format is unexpected
-        """
-        if not data or len(data) == 0:
-            return []
-        
-        # First row contains column headers
-        if len(data) < 2:
-            return []
-        
-        headers = data[0]
-        rows = data[1:]
-        
-        # Expected headers: ['timestamp', 'original', 'statuscode', 'mimetype']
-        if len(headers) < 4:
-            raise ValueError("Unexpected CDX response format: insufficient columns")
-        
-        urls = []
-        seen_urls: Set[str] = set()
-        
-        for row in rows:
-            if len(row) < 4:
-                continue  # Skip malformed rows
-            
-            timestamp, original_url, status_code, mime_type = row[:4]
-            
-            # Skip if we've already seen this URL (additional deduplication)
-            if original_url in seen_urls:
-                continue
-            seen_urls.add(original_url)
-            
-            # Only include HTML content
-            if not mime_type.startswith('text/html'):
-                continue
-            
-            # Construct the Wayback Machine URL
-            wayback_url = f"https://web.archive.org/web/{timestamp}/{original_url}"
-            
-            urls.append({
-                'url': original_url,
-                'timestamp': timestamp,
-                'wayback_url': wayback_url,
-                'status_code': status_code,
-                'mime_type': mime_type
-            })
-        
-        return urls
-
-    def _parse_cdx_json_with_resume(self, response: requests.Response) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    def _parse_cdx_text_with_resume(self, lines: Iterable[bytes]) -> Tuple[List[CDXRecord], Optional[str]]:
         """
-        Parse a CDX JSON page and detect resumeKey when showResumeKey=true.
+        Parse a plain-text CDX page (fl=timestamp,original) line by line.
 
-        Returns (records, resume_key)
+        With showResumeKey=true the key follows the records after a blank
+        line. Returns (records, resume_key).
         """
+        records: List[CDXRecord] = []
         resume_key: Optional[str] = None
-        try:
-            data = response.json()
-        except Exception:
-            # Fallback: try to find resumeKey in text
-            txt = response.text
-            # crude search for resumeKey pattern
-            if 'resumeKey' in txt:
-                # attempt to extract after colon
-                try:
-                    resume_key = txt.split('resumeKey')[-1].split(':', 1)[-1].strip().strip('"\'{}[] ,\n\r')
-                except Exception:
-                    resume_key = None
-            return [], resume_key
-
-        # Normal records
-        records = []
-        if not data or len(data) < 2:
-            return records, None
-        headers = data[0]
-        for row in data[1:]:
-            # Detect resumeKey row variants
-            if isinstance(row, dict) and 'resumeKey' in row:
-                resume_key = row.get('resumeKey')
+        after_blank = False
+        for raw in lines:
+            line = raw.decode('utf-8', 'replace').strip() if isinstance(raw, bytes) else raw.strip()
+            if not line:
+                after_blank = True
                 continue
-            if isinstance(row, str):
-                # Some servers return a plain string row for resumeKey
-                # Heuristic: if not the same length as headers and contains no spaces
-                if len(row) > 0 and len(row.split()) == 1 and len(headers) != 1:
-                    resume_key = row
-                    continue
-            if not isinstance(row, list) or len(row) < 4:
+            if after_blank:
+                resume_key = line
+                break
+            parts = line.split(' ', 2)
+            if len(parts) < 2:
                 continue
-            timestamp, original_url, status_code, mime_type = row[:4]
-            if not str(mime_type).startswith('text/html'):
-                continue
-            wayback_url = f"https://web.archive.org/web/{timestamp}/{original_url}"
-            records.append({
-                'url': original_url,
-                'timestamp': timestamp,
-                'wayback_url': wayback_url,
-                'status_code': status_code,
-                'mime_type': mime_type
-            })
+            timestamp, original = parts[0], parts[1]
+            records.append(CDXRecord(original, timestamp, _wayback_url(timestamp, original)))
         return records, resume_key
-    
-    def get_latest_capture(self, url: str) -> Optional[Dict[str, str]]:
+
+    def get_latest_capture(self, url: str) -> Optional[CDXRecord]:
         """
         Get the most recent capture of a specific URL.
         
@@ -298,7 +409,7 @@ class CDXClient:
             url: The specific URL to find the latest capture for
             
         Returns:
-            Dictionary with capture metadata, or None if not found
+            CDXRecord with capture metadata, or None if not found
         """
         params = {
             'url': url,
@@ -311,7 +422,7 @@ class CDXClient:
         
         try:
             response = self._make_request(params)
-            data = response.json()
+            data = _json_loads(response.content)
             
             if len(data) < 2:
                 return None
@@ -321,20 +432,13 @@ class CDXClient:
                 return None
             
             timestamp, original_url, status_code, mime_type = row[:4]
-            wayback_url = f"https://web.archive.org/web/{timestamp}/{original_url}"
-            
-            return {
-                'url': original_url,
-                'timestamp': timestamp,
-                'wayback_url': wayback_url,
-                'status_code': status_code,
-                'mime_type': mime_type
-            }
+            return CDXRecord(original_url, timestamp, _wayback_url(timestamp, original_url), status_code, mime_type)
             
         except requests.RequestException as e:
             self.logger.error(f"Failed to get latest capture for {url}: {e}")
             return None
     
     def close(self):
-        """Close the HTTP session."""
-        self.session.close()
+        """Close the HTTP session unless it is shared with other components."""
+        if self._owns_session:
+            self.session.close()
@@ -11,19 +11,25 @@ import time
 import logging
 from dataclasses import dataclass
 from typing import Callable, Optional, List, Dict, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
 import threading
 
-from .cdx_client import CDXClient
+from .cdx_client import CDXClient, CDXRecord
 from .html_retriever import HTMLRetriever
-from .html_cleaner import HTMLCleaner
-from .pdf_generator import PDFGenerator
-from .assets import AssetCollector, AssetDownloader, AssetRewriter, Asset
+from .html_cleaner import HTMLCleaner, clean_page
+from .pdf_generator import PDFGenerator, render_pdf
+from .assets import (AssetCollector, AssetDownloader, AssetRewriter, Asset, serialize_html,
+                     ref_resolver, DEFAULT_DOWNLOAD_WORKERS)
 from src.utils.file_manager import FileManager
 from src.utils.validators import normalize_host
-from src.utils.manifest import Manifest, ManifestRecord
+from src.utils.manifest import Manifest, ManifestRecord, ManifestWriter
 from src.utils.rate_limiter import TokenBucket
-from urllib.parse import urljoin
+from src.utils.http import create_session
+
+
+# Upper bound on page workers; the shared rate limiter caps request rate anyway
+MAX_WORKERS = 4
 
 
 @dataclass
@@ -39,6 +45,24 @@ class RunConfig:
     skip_completed: bool = True
     only_failed: bool = False
     asset_cache: bool = True
+    asset_cache_dir: Optional[str] = None  # None = <output_dir>/assets_cache
+    asset_revalidate: bool = False  # conditional GET for cached assets instead of trusting them
+    discovery_cache_ttl: float = 24 * 3600  # seconds; reuse CDX discovery results younger than this
+    refresh_discovery: bool = False  # ignore any cached discovery result
+    pdf_processes: Optional[int] = None  # PDF render processes; None = auto (none when serial), 0 = render in-thread
+    clean_processes: int = 0  # HTML cleaning processes; 0 = clean the streamed tree in-thread
+
+
+@dataclass(slots=True)
+class _RenderJob:
+    """A page whose HTML is saved and is waiting for PDF rendering."""
+    idx: int
+    page: CDXRecord
+    nkey: str
+    html: str
+    html_path: str
+    pdf_path: str
+    html_dir: str
 
 
 class ArchaicController:
@@ -48,24 +72,71 @@ class ArchaicController:
         # Shared rate limiter (~1 token per delay_secs)
         rate = 1.0 / max(self.config.delay_secs, 0.1)
         self.rate_limiter = TokenBucket(rate_per_sec=rate, burst=1, jitter_ms=300)
-        self.cdx = CDXClient(request_delay=config.delay_secs)
-        self.retriever = HTMLRetriever(request_delay=config.delay_secs, max_retries=config.max_retries, rate_limiter=self.rate_limiter)
+        # One keep-alive pool for all Wayback traffic: each page worker plus
+        # its asset download threads
+        workers = max(1, min(MAX_WORKERS, config.concurrency))
+        self.session = create_session(pool_maxsize=workers * (DEFAULT_DOWNLOAD_WORKERS + 1))
+        self.cdx = CDXClient(request_delay=config.delay_secs, session=self.session,
+                             cache_dir=os.path.join(config.output_dir, '.cdx_cache'),
+                             cache_ttl=config.discovery_cache_ttl, rate_limiter=self.rate_limiter)
+        self.retriever = HTMLRetriever(request_delay=config.delay_secs, max_retries=config.max_retries, rate_limiter=self.rate_limiter,
+                                       session=self.session)
         self.cleaner = HTMLCleaner()
         self.pdf = PDFGenerator()
         self.collector = AssetCollector()
-        # Global asset cache directory
-        assets_cache_dir = os.path.join(str(self.files.base_output_dir), 'assets_cache')
+        self.files = FileManager(config.output_dir)
+        # Global asset cache directory (persists across runs; may be shared between outputs)
+        assets_cache_dir = self.config.asset_cache_dir or os.path.join(str(self.files.base_output_dir), 'assets_cache')
         self.downloader = AssetDownloader(request_delay=config.delay_secs, rate_limiter=self.rate_limiter,
-                                          cache_dir=assets_cache_dir if getattr(self.config, 'asset_cache', True) else None)
+                                          cache_dir=assets_cache_dir if getattr(self.config, 'asset_cache', True) else None,
+                                          revalidate=self.config.asset_revalidate, session=self.session)
         self.rewriter = AssetRewriter()
-        self.files = FileManager(config.output_dir)
         self.manifest = Manifest(config.output_dir)
         self._stop_event = threading.Event()
-        self._manifest_lock = threading.Lock()
+        self._processed_lock = threading.Lock()
+        # css_url -> (dependency URLs, localized stylesheet bytes)
+        self._localized_css: Dict[str, Tuple[List[str], bytes]] = {}
+        self._css_lock = threading.Lock()
 
     def stop(self):
         self._stop_event.set()
 
+    def _localize_stylesheet(self, css_url: str, assets_mapping: Dict[str, str], assets_dir: str, ts: str) -> None:
+        """
+        Download a stylesheet's url(...) dependencies into assets_dir and
+        rewrite the page's copy of it to reference them.
+
+        Stylesheets are shared across pages and each page's asset directory
+        mirrors the same URL layout, so the rewritten CSS is identical for
+        every page: it is parsed and rewritten once per CSS URL, and later
+        pages only place the (cached) dependencies and write the stored bytes.
+        """
+        local_css = assets_mapping[css_url]
+        with self._css_lock:
+            known = self._localized_css.get(css_url)
+        if known is not None:
+            dep_urls, css_bytes = known
+            css = None
+        else:
+            # Scanned and rewritten as bytes; the stylesheet is never decoded
+            with open(local_css, 'rb') as f:
+                css = f.read()
+            resolve = ref_resolver(css_url)
+            dep_urls = list(dict.fromkeys(resolve(d) for d in self.rewriter.extract_css_dependencies(css)))
+        dep_assets = [Asset(url=u, type='image', attr='css') for u in dep_urls]
+        assets_mapping.update(self.downloader.download(dep_assets, assets_dir, ts))
+        if css is not None:
+            css_bytes = self.rewriter.localize_css(css, css_url, assets_mapping, os.path.dirname(local_css))
+            with self._css_lock:
+                self._localized_css.setdefault(css_url, (dep_urls, css_bytes))
+        with open(local_css, 'wb') as f:
+            f.write(css_bytes)
+
+    def close(self):
+        """Release the shared HTTP session and the asset cache index."""
+        self.downloader.close()
+        self.session.close()
+
     def run(self, progress: Optional[Callable[[object], None]] = None) -> Dict[str, int]:
         """Run Phases 1–4 serially with manifest tracking."""
         stats = {"discovered": 0, "downloaded": 0, "cleaned": 0, "pdf": 0, "failed": 0}
@@ -73,7 +144,7 @@ class ArchaicController:
         # Phase 1: Discover
         if progress:
             progress("Discovering URLs via CDX...")
-        pages = self.cdx.discover_urls(self.config.base_url)
+        pages = self.cdx.discover_urls(self.config.base_url, force_refresh=self.config.refresh_discovery)
         stats["discovered"] = len(pages)
         if progress:
             progress({"type": "discovery", "total": len(pages)})
@@ -86,69 +157,97 @@ class ArchaicController:
         # Resume support
         # Resume policy
         completed_set, failed_set = self.manifest.get_status_sets()
-        completed = completed_set
+        # Index completed timestamps by normalized URL so lookups need no
+        # tuple keys
+        completed: Dict[str, set] = {}
+        for nurl, ts in completed_set:
+            completed.setdefault(nurl, set()).add(ts)
 
-        # Filter pages by resume options
-        if self.config.only_failed:
-            filt = []
-            for page in pages:
-                ok, nurl, _ = normalize_host(page['url'])
-                nkey = (nurl if ok else page['url'], page['timestamp'])
-                # Only keep those currently marked failed and not completed
-                if nkey in failed_set and nkey not in completed_set:
-                    filt.append(page)
-            pages = filt
-        elif self.config.skip_completed:
-            filt = []
+        def selected():
+            """Normalize each discovered page once and apply the resume filters."""
             for page in pages:
-                ok, nurl, _ = normalize_host(page['url'])
-                nkey = (nurl if ok else page['url'], page['timestamp'])
-                if nkey not in completed_set:
-                    filt.append(page)
-            pages = filt
+                ok, nurl, _ = normalize_host(page.url)
+                nkey = nurl if ok else page.url
+                # Filter pages by resume options
+                if self.config.only_failed:
+                    # Only keep those currently marked failed and not completed
+                    if (nkey, page.timestamp) not in failed_set or page.timestamp in completed.get(nkey, ()):
+                        continue
+                elif self.config.skip_completed:
+                    if page.timestamp in completed.get(nkey, ()):
+                        continue
+                yield page, nkey
+
         processed: List[Dict[str, str]] = []
 
-        def process_one(idx: int, page: Dict[str, str]) -> Tuple[int, int, int, int]:
+        def fetch_one(idx: int, page: CDXRecord, nkey: str):
+            """Download, clean, localize assets and save HTML; returns counts or a _RenderJob."""
             if self._stop_event.is_set():
                 return (0, 0, 0, 0)
-            url = page['url']
-            ts = page['timestamp']
-            wayback_url = page['wayback_url']
-            ok, norm_url, _ = normalize_host(url)
-            nkey = norm_url if ok else url
-            if (nkey, ts) in completed:
+            url = page.url
+            ts = page.timestamp
+            wayback_url = page.wayback_url
+            if ts in completed.get(nkey, ()):
                 self.logger.info(f"Skipping completed: {url} @ {ts}")
                 return (0, 0, 0, 0)
             # Append discovered record
-            with self._manifest_lock:
-                self.manifest.append(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
-                                                    status='discovered', started_at=time.time(), finished_at=0.0))
+            self._manifest_writer.put(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
+                                                     status='discovered', started_at=time.time(), finished_at=0.0))
 
             if progress:
                 progress({"type": "url", "index": idx, "stage": "downloading", "url": url})
-            html_data = self.retriever.retrieve_page(wayback_url, url)
-            if not html_data or not html_data.get('html'):
-                with self._manifest_lock:
-                    self.manifest.append(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
-                                                        status='failed', error='download_failed', started_at=time.time(),
-                                                        finished_at=time.time()))
+            if clean_pool is not None:
+                # The page is cleaned in a worker process, which needs the
+                # document as text rather than as a tree
+                html_data = self.retriever.retrieve_page(wayback_url, url)
+                retrieved = bool(html_data and html_data.get('html'))
+            else:
+                # The response body is parsed as it streams in; the page is
+                # never held as a decoded string
+                html_data = self.retriever.retrieve_page(wayback_url, url, parse_stream=self.cleaner.parse_stream)
+                retrieved = bool(html_data and html_data.get('tree') is not None)
+            if not retrieved:
+                self._manifest_writer.put(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
+                                                         status='failed', error='download_failed', started_at=time.time(),
+                                                         finished_at=time.time()))
                 if progress:
                     progress({"type": "url", "index": idx, "stage": "failed", "url": url, "reason": "download"})
                 return (0, 0, 0, 1)
 
             if progress:
                 progress({"type": "url", "index": idx, "stage": "cleaning", "url": url})
-            cleaned = self.cleaner.clean_html(html_data['html'], url)
-            if not cleaned:
-                with self._manifest_lock:
-                    self.manifest.append(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
-                                                        status='failed', error='clean_failed', started_at=time.time(),
-                                                        finished_at=time.time()))
+            # Cleaning, asset collection, rewriting and embedding all mutate
+            # the streamed tree, which is serialized a single time
+            tree = None
+            cleaned_html = None
+            if clean_pool is not None:
+                try:
+                    cleaned_html = clean_pool.submit(clean_page, html_data['html'], url).result()
+                except Exception as e:
+                    self.logger.warning(f"Clean worker process failed for {url} ({e}); cleaning in-process")
+                    cleaned_html = self.cleaner.clean_html(html_data['html'], url)
+                if cleaned_html is not None and self.config.offline_assets:
+                    # Asset localization works on a tree of the cleaned page
+                    try:
+                        tree = self.cleaner.parse(cleaned_html)
+                    except Exception as e:
+                        self.logger.error(f"Failed to parse cleaned HTML for {url}: {e}")
+                        cleaned_html = None
+            else:
+                tree = html_data['tree']
+                try:
+                    self.cleaner.clean_tree(tree, url)
+                except Exception as e:
+                    self.logger.error(f"Failed to clean HTML for {url}: {e}")
+                    tree = None
+            if tree is None and cleaned_html is None:
+                self._manifest_writer.put(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
+                                                         status='failed', error='clean_failed', started_at=time.time(),
+                                                         finished_at=time.time()))
                 if progress:
                     progress({"type": "url", "index": idx, "stage": "failed", "url": url, "reason": "clean"})
                 return (0, 0, 0, 1)
 
-            final_html = cleaned
             assets_mapping: Dict[str, str] = {}
             html_path, pdf_path = self.files.get_file_paths(url, ts)
             html_dir = os.path.dirname(os.path.abspath(html_path))
@@ -157,86 +256,129 @@ class ArchaicController:
             if self.config.offline_assets:
                 if progress:
                     progress({"type": "url", "index": idx, "stage": "assets", "url": url})
-                assets = self.collector.collect(cleaned, url)
+                assets = self.collector.collect_tree(tree, url)
                 assets_mapping = self.downloader.download(assets, assets_dir, ts)
-                # Deep CSS pass: for downloaded CSS, fetch dependencies and rewrite CSS files
-                css_urls = [u for u in assets_mapping.keys() if u.lower().endswith('.css')]
-                for css_url in css_urls:
-                    # Read CSS content and extract dependencies
-                    local_css = assets_mapping[css_url]
+                # Deep CSS pass: fetch each stylesheet's dependencies and point
+                # its url(...)s at the local copies
+                for css_url in [u for u in assets_mapping if u.lower().endswith('.css')]:
                     try:
-                        with open(local_css, 'r', encoding='utf-8', errors='ignore') as f:
-                            css_content = f.read()
-                        deps = self.rewriter.extract_css_dependencies(css_content)
-                        dep_assets = []
-                        for d in deps:
-                            dep_abs = urljoin(css_url, d)
-                            dep_assets.append(Asset(url=dep_abs, type='image', attr='css'))
-                        dep_map = self.downloader.download(dep_assets, assets_dir, ts)
-                        assets_mapping.update(dep_map)
-                        # Rewrite CSS file using updated mapping
-                        self.rewriter.rewrite_css_file(local_css, assets_mapping, html_dir)
-                    except Exception:
-                        pass
-
-                final_html = self.rewriter.rewrite_html(cleaned, url, assets_mapping, html_dir, assets_relroot='assets')
+                        self._localize_stylesheet(css_url, assets_mapping, assets_dir, ts)
+                    except Exception as e:
+                        self.logger.warning(f"Failed to localize stylesheet {css_url}: {e}")
 
+                self.rewriter.rewrite_tree(tree, url, assets_mapping, html_dir, assets_relroot='assets')
                 if self.config.single_file_html:
-                    final_html = self.rewriter.embed_single_file(final_html, assets_mapping, html_dir)
+                    self.rewriter.embed_tree(tree, assets_mapping, html_dir)
+
+            if tree is not None:
+                final_html = serialize_html(tree)
+            else:
+                final_html = cleaned_html
 
             saved_path = self.files.save_html(final_html, url, ts)
 
+            # Rendering is handed to the PDF pool so this worker can move on
+            # to fetching the next page
+            return _RenderJob(idx, page, nkey, final_html, saved_path, pdf_path, html_dir)
+
+        def render_one(job: _RenderJob) -> Tuple[int, int, int, int]:
+            url, ts, wayback_url, nkey = job.page.url, job.page.timestamp, job.page.wayback_url, job.nkey
             if progress:
-                progress({"type": "url", "index": idx, "stage": "pdf", "url": url})
-            base_for_pdf = html_dir
-            pdf_ok = self.pdf.generate_pdf(final_html, pdf_path, title=None, original_url=url, base_url=base_for_pdf)
+                progress({"type": "url", "index": job.idx, "stage": "pdf", "url": url})
+            pdf_ok = None
+            if pdf_pool is not None:
+                try:
+                    pdf_ok = pdf_pool.submit(render_pdf, job.html, os.path.abspath(job.pdf_path), None, url,
+                                             job.html_dir).result()
+                except Exception as e:
+                    self.logger.warning(f"PDF worker process failed for {url} ({e}); rendering in-process")
+            if pdf_ok is None:
+                pdf_ok = self.pdf.generate_pdf(job.html, job.pdf_path, title=None, original_url=url, base_url=job.html_dir)
             if not pdf_ok:
-                with self._manifest_lock:
-                    self.manifest.append(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
-                                                        status='failed', error='pdf_failed', started_at=time.time(),
-                                                        finished_at=time.time(), html_path=saved_path, pdf_path=pdf_path))
+                self._manifest_writer.put(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
+                                                         status='failed', error='pdf_failed', started_at=time.time(),
+                                                         finished_at=time.time(), html_path=job.html_path, pdf_path=job.pdf_path))
                 if progress:
-                    progress({"type": "url", "index": idx, "stage": "failed", "url": url, "reason": "pdf"})
+                    progress({"type": "url", "index": job.idx, "stage": "failed", "url": url, "reason": "pdf"})
                 return (1, 1, 0, 1)
-            with self._manifest_lock:
-                self.manifest.append(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
-                                                    status='completed', started_at=time.time(), finished_at=time.time(),
-                                                    html_path=saved_path, pdf_path=pdf_path))
+            self._manifest_writer.put(ManifestRecord(url=url, normalized_url=nkey, timestamp=ts, wayback_url=wayback_url,
+                                                     status='completed', started_at=time.time(), finished_at=time.time(),
+                                                     html_path=job.html_path, pdf_path=job.pdf_path))
+            with self._processed_lock:
                 processed.append({
                     'url': url,
                     'timestamp': ts,
-                    'html_path': saved_path,
-                    'pdf_path': pdf_path,
+                    'html_path': job.html_path,
+                    'pdf_path': job.pdf_path,
                 })
             if progress:
-                progress({"type": "url", "index": idx, "stage": "completed", "url": url})
+                progress({"type": "url", "index": job.idx, "stage": "completed", "url": url})
             return (1, 1, 1, 0)
 
         if self.config.offline_assets is None:
             self.config.offline_assets = True
 
-        if getattr(self.config, 'concurrency', 1) and self.config.concurrency > 1:
-            # Two-worker mode with shared rate limiter
-            with ThreadPoolExecutor(max_workers=min(4, self.config.concurrency)) as ex:
-                futures = []
-                for idx, page in enumerate(pages, 1):
-                    futures.append(ex.submit(process_one, idx, page))
-                for fut in as_completed(futures):
-                    d,c,p,f = fut.result()
-                    stats["downloaded"] += d
-                    stats["cleaned"] += c
-                    stats["pdf"] += p
-                    stats["failed"] += f
-            # Recompute precise stats from manifest (optional); keep simple for now
-        else:
-            for i, page in enumerate(pages, 1):
-                if self._stop_event.is_set():
-                    break
-                d,c,p,f = process_one(i, page)
-                stats["downloaded"] += d
-                stats["cleaned"] += c
-                stats["pdf"] += p
-                stats["failed"] += f
+        # Workers hand manifest records to one background writer instead of
+        # appending under a lock
+        self._manifest_writer = ManifestWriter(self.manifest)
+        pdf_pool: Optional[ProcessPoolExecutor] = None
+        clean_pool: Optional[ProcessPoolExecutor] = None
+        try:
+            # Two-stage pipeline: page workers fetch HTML and assets under the
+            # shared rate limiter while a separate pool renders PDFs, so the
+            # network stays busy during rendering. Pages are fed through a
+            # bounded in-flight window so a stop request takes effect without
+            # draining a queue of every discovered page.
+            workers = max(1, min(MAX_WORKERS, self.config.concurrency or 1))
+            render_workers = self.config.pdf_processes
+            if render_workers is None:
+                # A serial run has no other renders to overlap with, so it
+                # renders in-thread rather than paying for a spawned process
+                # (which re-imports the app and WeasyPrint) and for pickling
+                # every page's HTML across to it
+                render_workers = min(workers, os.cpu_count() or 1) if workers > 1 else 0
+            if render_workers > 0:
+                # Rendering holds the GIL, so it runs in worker processes; the
+                # render threads just wait on them. spawn avoids forking a
+                # process that has live threads and open sockets
+                pdf_pool = ProcessPoolExecutor(max_workers=render_workers,
+                                               mp_context=multiprocessing.get_context('spawn'))
+            render_workers = max(1, render_workers)
+            if self.config.clean_processes and self.config.clean_processes > 0:
+                # Cleaning is CPU-bound too; page workers wait on these
+                # processes while other pages keep downloading
+                clean_pool = ProcessPoolExecutor(max_workers=self.config.clean_processes,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            window = workers * 2 + render_workers
+            pending = ((i, page, nkey) for i, (page, nkey) in enumerate(selected(), 1))
+            with ThreadPoolExecutor(max_workers=workers) as fetch_ex, \
+                    ThreadPoolExecutor(max_workers=render_workers) as render_ex:
+                in_flight = set()
+                while True:
+                    while len(in_flight) < window and not self._stop_event.is_set():
+                        nxt = next(pending, None)
+                        if nxt is None:
+                            break
+                        in_flight.add(fetch_ex.submit(fetch_one, *nxt))
+                    if not in_flight:
+                        break
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        result = fut.result()
+                        if isinstance(result, _RenderJob):
+                            in_flight.add(render_ex.submit(render_one, result))
+                            continue
+                        d,c,p,f = result
+                        stats["downloaded"] += d
+                        stats["cleaned"] += c
+                        stats["pdf"] += p
+                        stats["failed"] += f
+        finally:
+            if pdf_pool is not None:
+                pdf_pool.shutdown()
+            if clean_pool is not None:
+                clean_pool.shutdown()
+            self._manifest_writer.close()
 
         # Generate/refresh index from processed entries
         try:
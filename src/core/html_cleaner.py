@@ -6,12 +6,205 @@ by removing the injected archive interface elements while preserving the
 original page content and styling.
 """
 
-from bs4 import BeautifulSoup, Comment
 import re
 import logging
-from typing import Optional, List, Set
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Optional, List, Set, Union
 import urllib.parse as urlparse
 
+import lxml.html
+from lxml import etree
+
+from src.utils.http import detect_html_encoding
+
+try:
+    # Linear-time DFA matching for the patterns scanned over whole documents
+    import re2 as _scan_re
+except ImportError:  # pragma: no cover - optional speedup
+    _scan_re = re
+
+
+# Script patterns that indicate Wayback Machine injection
+WAYBACK_SCRIPT_PATTERNS = (
+    r'web\.archive\.org',
+    r'wayback',
+    r'wbhack',
+    r'_wb_wombat',
+    r'archive_analytics',
+    r'__wb_',
+)
+
+# Wayback Machine specific elements to remove
+WAYBACK_SELECTORS = (
+    # Main archive toolbar/header
+    '#wm-ipp-base',
+    '#wm-ipp',
+    '.wb-overlay',
+    '#donato',
+    
+    # Archive notification banners
+    '.wb-autocomplete-suggestions',
+    '#wm-capresources',
+    '#wm-expand',
+    
+    # Various wayback UI elements
+    '[id^="wm-"]',
+    '[class^="wb-"]',
+    '[class*="wayback"]',
+    '[id*="wayback"]',
+)
+
+# URL prefixes added by the Wayback Machine / Archive-It
+WAYBACK_URL_PATTERNS = (
+    r'https?://web\.archive\.org/web/\d+[a-z_]*/',
+    r'https?://wayback\.archive-it\.org/\d+/\d+/',
+)
+
+# Each list is matched as one alternation, so every string is scanned once.
+# Flags are inline so the patterns compile the same under re2 and re.
+_SCRIPT_RE = _scan_re.compile('(?i)' + '|'.join(WAYBACK_SCRIPT_PATTERNS))
+_URL_RE = _scan_re.compile('(?i)' + '|'.join(WAYBACK_URL_PATTERNS))
+_MARKER_RE = re.compile(r'wayback|wb-|wm-', re.I)
+# Data attributes added by the Wayback Machine
+_WAYBACK_DATA_ATTR_PREFIXES = ('data-wb', 'data-wayback')
+# Class name prefixes stripped from elements that are kept
+_CLASS_PREFIXES = ('wb-', 'wm-', 'wayback')
+
+# Opening tags counted by validate_cleaned_content, and the bucket each falls in
+_TAG_RE = _scan_re.compile(r'(?i)<(p|h[1-6]|img|a|div|script|style)\b')
+_TAG_RE_B = _scan_re.compile(rb'(?i)<(p|h[1-6]|img|a|div|script|style)\b')
+_TAG_BUCKETS = {
+    'p': 'paragraphs',
+    'h1': 'headings', 'h2': 'headings', 'h3': 'headings',
+    'h4': 'headings', 'h5': 'headings', 'h6': 'headings',
+    'img': 'images',
+    'a': 'links',
+    'div': 'divs',
+    'script': 'scripts',
+    'style': 'styles',
+}
+
+# Attribute selectors understood by _SelectorUnion: [attr^="v"], [attr*="v"], [attr="v"]
+_ATTR_SELECTOR_RE = re.compile(r'^\[([\w-]+)([\^*]?)="([^"]*)"\]$')
+
+# Comments (the Wayback toolbar markers among them) and ignorable
+# whitespace are dropped by the parser, so they never reach the tree
+_PARSER_OPTIONS = dict(recover=True, huge_tree=False, remove_comments=True, remove_blank_text=True)
+# Bytes fed to the pull parser at a time when only <head> is wanted
+_HEAD_CHUNK_SIZE = 16 * 1024
+
+# Attributes holding URLs that are restored to the original site
+_URL_ATTRIBUTES = frozenset(('href', 'src', 'action', 'data-src'))
+# URL attribute values left as they are rather than resolved against the site
+_NON_RELATIVE_PREFIXES = ('http://', 'https://', '//', 'mailto:', 'javascript:', '#')
+
+
+class _SelectorUnion:
+    """
+    The simple CSS selectors used for Wayback UI elements (#id, .class and
+    quoted attribute prefix/substring/equality tests) merged into one
+    element predicate: ids and classes become set lookups, and each
+    attribute's tests a single startswith tuple, regex or set.
+    """
+
+    def __init__(self, selectors: List[str]):
+        self.unsupported: List[str] = []
+        self.ids: Set[str] = set()
+        self.classes: Set[str] = set()
+        prefixes: dict = {}
+        substrings: dict = {}
+        self.equals: dict = {}
+        for selector in selectors:
+            if re.fullmatch(r'#[\w-]+', selector):
+                self.ids.add(selector[1:])
+                continue
+            if re.fullmatch(r'\.[\w-]+', selector):
+                self.classes.add(selector[1:])
+                continue
+            m = _ATTR_SELECTOR_RE.match(selector)
+            if not m:
+                self.unsupported.append(selector)
+                continue
+            attr, op, value = m.groups()
+            if op == '^':
+                prefixes.setdefault(attr, []).append(value)
+            elif op == '*':
+                substrings.setdefault(attr, []).append(re.escape(value))
+            else:
+                self.equals.setdefault(attr, set()).add(value)
+        self.prefixes = [(attr, tuple(values)) for attr, values in prefixes.items()]
+        self.substrings = [(attr, re.compile('|'.join(values))) for attr, values in substrings.items()]
+
+    def __call__(self, el) -> bool:
+        get = el.get
+        if self.ids and get('id') in self.ids:
+            return True
+        if self.classes:
+            classes = get('class')
+            if classes and not self.classes.isdisjoint(classes.split()):
+                return True
+        for attr, values in self.prefixes:
+            value = get(attr)
+            if value and value.startswith(values):
+                return True
+        for attr, pattern in self.substrings:
+            value = get(attr)
+            if value and pattern.search(value):
+                return True
+        for attr, values in self.equals.items():
+            if get(attr) in values:
+                return True
+        return False
+
+
+# Selectors merged once into a single predicate shared by every cleaner
+_SELECTOR_UNION = _SelectorUnion(WAYBACK_SELECTORS)
+
+
+def _empty_counts() -> dict:
+    return dict.fromkeys(('paragraphs', 'headings', 'images', 'links', 'divs', 'scripts', 'styles'), 0)
+
+
+def _count_tree(element, counts: dict) -> None:
+    """Add the important elements in element's subtree to counts."""
+    for el in element.iter(*_TAG_BUCKETS):
+        counts[_TAG_BUCKETS[el.tag]] += 1
+
+
+@lru_cache(maxsize=1024)
+def _base_domain(url: str) -> str:
+    """scheme://netloc of url; repeat captures of a page reuse the parse."""
+    parsed = urlparse.urlsplit(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _drop(el) -> bool:
+    """Remove el (keeping its tail text); the root element is never removed."""
+    if el.getparent() is None:
+        return False
+    el.drop_tree()
+    return True
+
+
+# Per-process cleaner used by clean_page (one per pool worker)
+_process_cleaner: Optional["HTMLCleaner"] = None
+
+
+def clean_page(html_content: Union[str, bytes], original_url: str) -> Optional[str]:
+    """
+    Module-level entry point for cleaning in a worker process.
+
+    The cleaning walk is pure Python and holds the GIL, so the controller can
+    submit this function to a ProcessPoolExecutor; the page crosses the
+    process boundary as text or bytes and comes back as cleaned HTML.
+    """
+    global _process_cleaner
+    if _process_cleaner is None:
+        _process_cleaner = HTMLCleaner()
+    return _process_cleaner.clean_html(html_content, original_url)
+
 
 class HTMLCleaner:
     """
@@ -29,84 +222,60 @@ class HTMLCleaner:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
-        # Wayback Machine specific elements to remove
-        self.wayback_selectors = [
-            # Main archive toolbar/header
-            '#wm-ipp-base',
-            '#wm-ipp',
-            '.wb-overlay',
-            '#donato',
-            
-            # Archive notification banners
-            '.wb-autocomplete-suggestions',
-            '#wm-capresources',
-            '#wm-expand',
-            
-            # Various wayback UI elements
-            '[id^="wm-"]',
-            '[class^="wb-"]',
-            '[class*="wayback"]',
-            '[id*="wayback"]'
-        ]
-        
-        # Script patterns that indicate Wayback Machine injection
-        self.wayback_script_patterns = [
-            r'web\.archive\.org',
-            r'wayback',
-            r'wbhack',
-            r'_wb_wombat',
-            r'archive_analytics',
-            r'__wb_'
-        ]
-        
-        # URL patterns to clean/remove
-        self.wayback_url_patterns = [
-            r'https?://web\.archive\.org/web/\d+[a-z_]*/',
-            r'https?://wayback\.archive-it\.org/\d+/\d+/'
-        ]
+        for selector in _SELECTOR_UNION.unsupported:
+            self.logger.warning(f"Unsupported Wayback selector ignored: {selector}")
+        # lxml parsers must not be shared between threads, so each worker
+        # thread keeps its own (one per input encoding)
+        self._local = threading.local()
     
-    def clean_html(self, html_content: str, original_url: str) -> Optional[str]:
+    def clean_html(self, html_content: Union[str, bytes], original_url: str,
+                   head_only: bool = False) -> Optional[str]:
         """
         Clean HTML content by removing Wayback Machine interface elements.
         
         Args:
-            html_content: Raw HTML content from Wayback Machine
+            html_content: Raw HTML content from Wayback Machine, as text or
+                as the undecoded response body
             original_url: The original URL of the page (for URL restoration)
+            head_only: Stop parsing where <body> starts and return the
+                cleaned <head> with an empty body (for metadata extraction)
             
         Returns:
             Cleaned HTML content, or None if cleaning fails
         """
+        return self._clean_html(html_content, original_url, head_only=head_only)
+
+    def clean_html_with_counts(self, html_content: Union[str, bytes], original_url: str) -> Optional[dict]:
+        """
+        Clean HTML like clean_html and also count the important elements
+        before and after cleaning during the same tree walk.
+        
+        Returns:
+            Dictionary with 'cleaned_html', 'original_size',
+            'original_counts' and 'cleaned_counts' (pass it to
+            validate_cleaned_content), or None if cleaning fails
+        """
+        element_counts = {'original': _empty_counts(), 'cleaned': _empty_counts()}
+        cleaned_html = self._clean_html(html_content, original_url, element_counts)
+        if cleaned_html is None:
+            return None
+        return {
+            'cleaned_html': cleaned_html,
+            'original_size': len(html_content),
+            'original_counts': element_counts['original'],
+            'cleaned_counts': element_counts['cleaned'],
+        }
+
+    def _clean_html(self, html_content: Union[str, bytes], original_url: str,
+                    element_counts: Optional[dict] = None, head_only: bool = False) -> Optional[str]:
         try:
-            self.logger.info(f"Cleaning HTML content for: {original_url}")
-            
             # Parse the HTML
-            soup = BeautifulSoup(html_content, 'lxml')
+            root = self.parse_head(html_content) if head_only else self.parse(html_content)
             
-            # Remove Wayback Machine UI elements
-            self._remove_wayback_elements(soup)
+            self.clean_tree(root, original_url, element_counts)
             
-            # Clean up scripts
-            self._clean_scripts(soup)
+            cleaned_html = lxml.html.tostring(root.getroottree(), encoding='unicode')
             
-            # Clean up stylesheets
-            self._clean_stylesheets(soup)
-            
-            # Restore original URLs where possible
-            self._restore_urls(soup, original_url)
-            
-            # Remove archive-injected comments
-            self._remove_wayback_comments(soup)
-            
-            # Clean up any remaining wayback artifacts
-            self._final_cleanup(soup)
-            
-            # Get the cleaned HTML
-            cleaned_html = str(soup)
-            
-            # Final text-based cleaning
-            cleaned_html = self._post_process_html(cleaned_html)
-            
-            self.logger.info(f"Successfully cleaned HTML for: {original_url}")
             self.logger.debug(f"Original size: {len(html_content)}, Cleaned size: {len(cleaned_html)}")
             
             return cleaned_html
@@ -114,204 +283,246 @@ class HTMLCleaner:
         except Exception as e:
             self.logger.error(f"Failed to clean HTML for {original_url}: {e}")
             return None
-    
-    def _remove_wayback_elements(self, soup: BeautifulSoup) -> None:
-        """Remove Wayback Machine UI elements using CSS selectors."""
-        removed_count = 0
-        
-        for selector in self.wayback_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                element.decompose()
-                removed_count += 1
-        
-        # Also remove elements with wayback-related attributes
-        for element in soup.find_all(attrs={'class': re.compile(r'wayback|wb-|wm-', re.I)}):
-            element.decompose()
-            removed_count += 1
-            
-        for element in soup.find_all(attrs={'id': re.compile(r'wayback|wb-|wm-', re.I)}):
-            element.decompose()
-            removed_count += 1
-        
-        if removed_count > 0:
-            self.logger.debug(f"Removed {removed_count} Wayback UI elements")
-    
-    def _clean_scripts(self, soup: BeautifulSoup) -> None:
-        """Remove Wayback Machine injected scripts."""
-        scripts_to_remove = []
-        
-        for script in soup.find_all('script'):
-            script_content = script.get_text() if script.string else ''
-            script_src = script.get('src', '')
-            
-            # Check if this is a Wayback-injected script
-            is_wayback_script = False
-            
-            for pattern in self.wayback_script_patterns:
-                if re.search(pattern, script_content, re.I) or re.search(pattern, script_src, re.I):
-                    is_wayback_script = True
-                    break
-            
-            if is_wayback_script:
-                scripts_to_remove.append(script)
-        
-        for script in scripts_to_remove:
-            script.decompose()
-        
-        if scripts_to_remove:
-            self.logger.debug(f"Removed {len(scripts_to_remove)} Wayback scripts")
-    
-    def _clean_stylesheets(self, soup: BeautifulSoup) -> None:
-        """Remove Wayback Machine injected stylesheets."""
-        styles_to_remove = []
-        
-        # Remove link elements pointing to Wayback resources
-        for link in soup.find_all('link', rel='stylesheet'):
-            href = link.get('href', '')
-            if any(re.search(pattern, href, re.I) for pattern in self.wayback_url_patterns):
-                styles_to_remove.append(link)
-        
-        # Remove style elements with Wayback content
-        for style in soup.find_all('style'):
-            style_content = style.get_text() if style.string else ''
-            if any(re.search(pattern, style_content, re.I) for pattern in self.wayback_script_patterns):
-                styles_to_remove.append(style)
-        
-        for style in styles_to_remove:
-            style.decompose()
-        
-        if styles_to_remove:
-            self.logger.debug(f"Removed {len(styles_to_remove)} Wayback stylesheets")
-    
-    def _restore_urls(self, soup: BeautifulSoup, original_url: str) -> None:
-        """Attempt to restore original URLs from Wayback Machine URLs."""
-        restored_count = 0
-        
-        # Get the base domain from original URL
-        parsed_original = urlparse.urlparse(original_url)
-        base_domain = f"{parsed_original.scheme}://{parsed_original.netloc}"
-        
-        # Restore URLs in common attributes
-        url_attributes = ['href', 'src', 'action', 'data-src']
-        
-        for attr in url_attributes:
-            for element in soup.find_all(attrs={attr: True}):
-                original_attr = element[attr]
-                cleaned_url = self._clean_archived_url(original_attr, base_domain)
-                
-                if cleaned_url != original_attr:
-                    element[attr] = cleaned_url
-                    restored_count += 1
-        
-        if restored_count > 0:
-            self.logger.debug(f"Restored {restored_count} URLs")
-    
-    def _clean_archived_url(self, url: str, base_domain: str) -> str:
+
+    def parse(self, html_content: Union[str, bytes], encoding: Optional[str] = None):
         """
-        Clean a single URL by removing Wayback Machine prefixes.
+        Parse a page with the reused lxml parser and return the document root.
+        The tree can go through clean_tree and the asset collect/rewrite steps
+        before being serialized once.
         
-        Args:
-            url: The URL to clean
-            base_domain: Base domain of the original site
-            
-        Returns:
-            Cleaned URL
+        Bytes are handed to lxml undecoded, in encoding if given or else
+        the charset named by a BOM or <meta charset> (UTF-8 by default).
         """
-        if not url or not isinstance(url, str):
-            return url
+        if isinstance(html_content, bytes):
+            if encoding is None:
+                encoding = detect_html_encoding('', html_content)
+            return lxml.html.document_fromstring(html_content, parser=self._thread_parser(encoding))
+        try:
+            return lxml.html.document_fromstring(html_content, parser=self._thread_parser())
+        except ValueError:
+            # lxml rejects str input carrying an XML encoding declaration
+            return lxml.html.document_fromstring(html_content.encode('utf-8'), parser=self._thread_parser('utf-8'))
+
+    def parse_head(self, html_content: Union[str, bytes], encoding: Optional[str] = None):
+        """
+        Parse a page only as far as the start of <body> and return the
+        document root; the body element is kept but left empty. Bytes are
+        decoded as in parse.
+        """
+        options = dict(_PARSER_OPTIONS)
+        if isinstance(html_content, bytes):
+            options['encoding'] = encoding or detect_html_encoding('', html_content)
+        parser = etree.HTMLPullParser(events=('start',), **options)
+        parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        for start in range(0, len(html_content), _HEAD_CHUNK_SIZE):
+            parser.feed(html_content[start:start + _HEAD_CHUNK_SIZE])
+            if any(el.tag == 'body' for _, el in parser.read_events()):
+                break
+        root = parser.close()
+        body = root.find('body')
+        if body is not None:
+            # Whatever of the body arrived in the last chunk is dropped
+            body.text = None
+            for child in list(body):
+                body.remove(child)
+        return root
+
+    def parse_stream(self, chunks: Iterable[bytes], encoding: Optional[str] = None):
+        """
+        Parse a page fed incrementally as byte chunks (e.g. straight from a
+        streamed response) and return the document root, or None if the
+        document is empty. The body is never joined into one buffer or
+        decoded into a str.
+        """
+        parser = self._thread_parser(encoding)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    parser.feed(chunk)
+        except BaseException:
+            # Reset the feed state so the parser can be reused
+            try:
+                parser.close()
+            except etree.XMLSyntaxError:
+                pass
+            raise
+        try:
+            return parser.close()
+        except etree.XMLSyntaxError:
+            return None
+
+    def _thread_parser(self, encoding: Optional[str] = None) -> lxml.html.HTMLParser:
+        """This thread's reusable lxml parser for the given input encoding."""
+        parsers = getattr(self._local, 'parsers', None)
+        if parsers is None:
+            parsers = self._local.parsers = {}
+        parser = parsers.get(encoding)
+        if parser is None:
+            parser = parsers[encoding] = lxml.html.HTMLParser(**_PARSER_OPTIONS, encoding=encoding)
+        return parser
+
+    def clean_tree(self, root, original_url: str, element_counts: Optional[dict] = None) -> None:
+        """
+        Remove Wayback Machine interface elements from a parsed document in place.
         
-        # Remove Wayback Machine URL prefixes
-        for pattern in self.wayback_url_patterns:
-            url = re.sub(pattern, '', url)
+        Serializing the tree gives the same output as clean_html. If element_counts is given, its
+        'original' and 'cleaned' count dicts are incremented for the
+        important elements seen before and left after cleaning.
+        """
+        self.logger.info(f"Cleaning HTML content for: {original_url}")
         
-        # Handle relative URLs
-        if url.startswith('/') and not url.startswith('//'):
-            url = base_domain + url
-        elif url.startswith('../') or not url.startswith(('http://', 'https://', '//', 'mailto:', 'javascript:', '#')):
-            # Handle relative paths - attempt to make them absolute
-            if not url.startswith('#') and not url.startswith('javascript:'):
-                url = base_domain + '/' + url.lstrip('./')
+        # Get the base domain from original URL
+        base_domain = _base_domain(original_url)
         
-        return url
-    
-    def _remove_wayback_comments(self, soup: BeautifulSoup) -> None:
-        """Remove HTML comments injected by Wayback Machine."""
-        comments_removed = 0
+        # One walk over the tree applies every rule to each node; removed
+        # elements are not descended into
+        counts = {'ui': 0, 'scripts': 0, 'stylesheets': 0, 'urls': 0}
+        stack = [root]
+        while stack:
+            element = stack.pop()
+            # Strip Wayback URL prefixes from text as it is visited; the tail
+            # first, since removing the element moves its tail
+            tail = element.tail
+            if tail and '://' in tail:
+                element.tail = _URL_RE.sub('', tail)
+            if not isinstance(element.tag, str):
+                continue
+            reason = self._removal_reason(element)
+            if reason and _drop(element):
+                counts[reason] += 1
+                if element_counts is not None:
+                    _count_tree(element, element_counts['original'])
+                continue
+            counts['urls'] += self._clean_attributes(element, base_domain)
+            text = element.text
+            if element.tag in ('script', 'style') and not (text and text.strip()):
+                # Empty scripts and styles left behind are dropped
+                if _drop(element):
+                    if element_counts is not None:
+                        _count_tree(element, element_counts['original'])
+                    continue
+            elif text and '://' in text:
+                element.text = _URL_RE.sub('', text)
+            if element_counts is not None:
+                bucket = _TAG_BUCKETS.get(element.tag)
+                if bucket:
+                    element_counts['original'][bucket] += 1
+                    element_counts['cleaned'][bucket] += 1
+            stack.extend(element)
         
-        comments = soup.find_all(string=lambda text: isinstance(text, Comment))
-        for comment in comments:
-            comment_text = str(comment).lower()
-            if any(keyword in comment_text for keyword in ['wayback', 'archive.org', 'web.archive', 'begin wayback']):
-                comment.extract()
-                comments_removed += 1
+        removed = {k: v for k, v in counts.items() if v}
+        if removed:
+            self.logger.debug(f"Removed/restored Wayback artifacts: {removed}")
         
-        if comments_removed > 0:
-            self.logger.debug(f"Removed {comments_removed} Wayback comments")
+        self.logger.info(f"Successfully cleaned HTML for: {original_url}")
     
-    def _final_cleanup(self, soup: BeautifulSoup) -> None:
-        """Perform final cleanup of any remaining Wayback artifacts."""
-        # Remove any remaining elements with wayback data attributes
-        for element in soup.find_all():
-            if element.attrs:
-                attrs_to_remove = []
-                for attr in element.attrs.keys():
-                    if attr.lower().startswith(('data-wb', 'data-wayback')):
-                        attrs_to_remove.append(attr)
-                
-                for attr in attrs_to_remove:
-                    del element.attrs[attr]
-        
-        # Clean up any remaining wayback classes
-        for element in soup.find_all(class_=True):
-            classes = element.get('class', [])
-            clean_classes = [cls for cls in classes if not re.match(r'wb-|wm-|wayback', cls, re.I)]
-            if clean_classes != classes:
-                element['class'] = clean_classes if clean_classes else None
-                if not clean_classes:
-                    del element['class']
+    def _removal_reason(self, element) -> Optional[str]:
+        """Return which Wayback rule removes element, or None to keep it."""
+        # Wayback Machine UI elements
+        if _SELECTOR_UNION(element):
+            return 'ui'
+        # Also remove elements with wayback-related attributes
+        if _MARKER_RE.search(element.get('class', '')) or _MARKER_RE.search(element.get('id', '')):
+            return 'ui'
+        tag = element.tag
+        if tag == 'script':
+            # Wayback-injected scripts; a script with a src ignores its
+            # body, so only the src is scanned
+            src = element.get('src')
+            if src:
+                if _SCRIPT_RE.search(src):
+                    return 'scripts'
+            else:
+                text = element.text
+                if text and _SCRIPT_RE.search(text):
+                    return 'scripts'
+        elif tag == 'link':
+            # Link elements pointing to Wayback resources
+            if ('stylesheet' in (element.get('rel') or '').lower().split()
+                    and _URL_RE.search(element.get('href', ''))):
+                return 'stylesheets'
+        elif tag == 'style':
+            # Style elements with Wayback content
+            text = element.text
+            if text and _SCRIPT_RE.search(text):
+                return 'stylesheets'
+        return None
     
-    def _post_process_html(self, html: str) -> str:
+    def _clean_attributes(self, element, base_domain: str) -> int:
         """
-        Perform final text-based cleaning on the HTML string.
-        
-        Args:
-            html: HTML content as string
-            
-        Returns:
-            Post-processed HTML content
+        Restore original URLs, drop Wayback data attributes and classes, and
+        strip any remaining Wayback prefixes, all in one pass over the
+        element's attributes. Returns the number of URLs restored.
         """
-        # Remove any remaining Wayback Machine URLs in the HTML text
-        for pattern in self.wayback_url_patterns:
-            html = re.sub(pattern, '', html)
-        
-        # Remove empty script and style tags that might be left behind
-        html = re.sub(r'<script[^>]*>\s*</script>', '', html, flags=re.IGNORECASE)
-        html = re.sub(r'<style[^>]*>\s*</style>', '', html, flags=re.IGNORECASE)
+        attrib = element.attrib
+        if not attrib:
+            return 0
+        restored = 0
         
-        # Clean up excessive whitespace
-        html = re.sub(r'\n\s*\n\s*\n', '\n\n', html)
+        for attr, value in attrib.items():
+            # Remove wayback data attributes (the HTML parser lowercases names)
+            if attr.startswith(_WAYBACK_DATA_ATTR_PREFIXES):
+                attrib.pop(attr)
+                continue
+            # Remove Wayback Machine URL prefixes (every prefix contains ://)
+            cleaned = _URL_RE.sub('', value) if '://' in value else value
+            if attr in _URL_ATTRIBUTES and cleaned:
+                # Restore original URLs where possible by making relative
+                # URLs absolute against the original site
+                if cleaned[0] == '/':
+                    if not cleaned.startswith('//'):
+                        cleaned = base_domain + cleaned
+                elif not cleaned.startswith(_NON_RELATIVE_PREFIXES):
+                    cleaned = base_domain + '/' + cleaned.lstrip('./')
+                if cleaned != value:
+                    restored += 1
+            if cleaned != value:
+                attrib[attr] = cleaned
         
-        return html
+        # Clean up any remaining wayback classes
+        classes_attr = attrib.get('class')
+        if classes_attr:
+            classes = classes_attr.split()
+            clean_classes = [cls for cls in classes if not cls.lower().startswith(_CLASS_PREFIXES)]
+            if len(clean_classes) != len(classes):
+                if clean_classes:
+                    attrib['class'] = ' '.join(clean_classes)
+                else:
+                    del attrib['class']
+        return restored
     
-    def validate_cleaned_content(self, original_html: str, cleaned_html: str) -> dict:
+    def validate_cleaned_content(self, original_html: Union[str, bytes, dict],
+                                 cleaned_html: Union[str, bytes, None] = None) -> dict:
         """
         Validate that the cleaning process preserved important content.
         
+        Pass the dict returned by clean_html_with_counts to reuse the counts
+        taken while cleaning. Given two documents instead, element counts
+        come from a regex scan of opening tags rather than a parse, so tags
+        inside comments or script text are counted too.
+        
         Args:
-            original_html: Original HTML before cleaning
-            cleaned_html: HTML after cleaning
+            original_html: Original HTML before cleaning (str or bytes), or
+                a clean_html_with_counts result
+            cleaned_html: HTML after cleaning (str or bytes); omitted with a
+                clean_html_with_counts result
             
         Returns:
             Dictionary with validation results
         """
         try:
-            original_soup = BeautifulSoup(original_html, 'lxml')
-            cleaned_soup = BeautifulSoup(cleaned_html, 'lxml')
-            
-            # Count important elements
-            original_counts = self._count_elements(original_soup)
-            cleaned_counts = self._count_elements(cleaned_soup)
+            if isinstance(original_html, dict):
+                result = original_html
+                original_size = result['original_size']
+                cleaned_size = len(result['cleaned_html'])
+                original_counts = result['original_counts']
+                cleaned_counts = result['cleaned_counts']
+            else:
+                original_size = len(original_html)
+                cleaned_size = len(cleaned_html)
+                # Count important elements
+                original_counts = self._count_elements(original_html)
+                cleaned_counts = self._count_elements(cleaned_html)
             
             # Calculate preservation ratios
             preservation_ratios = {}
@@ -323,9 +534,9 @@ class HTMLCleaner:
                     preservation_ratios[element_type] = 1.0
             
             return {
-                'original_size': len(original_html),
-                'cleaned_size': len(cleaned_html),
-                'size_reduction': 1 - (len(cleaned_html) / len(original_html)),
+                'original_size': original_size,
+                'cleaned_size': cleaned_size,
+                'size_reduction': 1 - (cleaned_size / original_size),
                 'element_counts': {
                     'original': original_counts,
                     'cleaned': cleaned_counts
@@ -337,14 +548,11 @@ class HTMLCleaner:
             self.logger.error(f"Validation failed: {e}")
             return {}
     
-    def _count_elements(self, soup: BeautifulSoup) -> dict:
-        """Count important HTML elements in the soup."""
-        return {
-            'paragraphs': len(soup.find_all('p')),
-            'headings': len(soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])),
-            'images': len(soup.find_all('img')),
-            'links': len(soup.find_all('a')),
-            'divs': len(soup.find_all('div')),
-            'scripts': len(soup.find_all('script')),
-            'styles': len(soup.find_all('style'))
-        }
\ No newline at end of file
+    def _count_elements(self, html: Union[str, bytes]) -> dict:
+        """Count important HTML elements by scanning for their opening tags."""
+        tag_re = _TAG_RE_B if isinstance(html, bytes) else _TAG_RE
+        tags = Counter(tag.lower() for tag in tag_re.findall(html))
+        counts = _empty_counts()
+        for tag, n in tags.items():
+            counts[_TAG_BUCKETS[tag if isinstance(tag, str) else tag.decode('ascii')]] += n
+        return counts
@@ -5,11 +5,39 @@ This module handles downloading HTML content from Wayback Machine URLs
 with respectful rate limiting and robust error handling.
 """
 
+import re
 import requests
 import time
-from typing import Optional, Dict, Any, Callable
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator
 import logging
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.utils.http import create_session, detect_html_encoding
+from src.utils.rate_limiter import TokenBucket
+
+
+# scheme://netloc/path of a URL, without parsing query or fragment
+_URL_PARTS_RE = re.compile(r'(?i:https?)://([^/?#]*)([^?#]*)')
+# Bytes read from the socket per chunk when streaming into a parser
+STREAM_CHUNK_SIZE = 32 * 1024
+# Concurrent downloads in retrieve_multiple; the rate limiter paces them
+DEFAULT_RETRIEVE_WORKERS = 4
+
+
+class _ByteCounter:
+    """Iterate a first chunk followed by the rest, counting bytes as they pass."""
+
+    def __init__(self, head: bytes, rest: Iterator[bytes]):
+        self.head = head
+        self.rest = rest
+        self.size = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self.head:
+            self.size += len(self.head)
+            yield self.head
+        for chunk in self.rest:
+            self.size += len(chunk)
+            yield chunk
 
 
 class HTMLRetriever:
@@ -22,33 +50,42 @@ class HTMLRetriever:
     - User-agent identification
     """
     
-    def __init__(self, request_delay: float = 1.5, max_retries: int = 3, rate_limiter=None):
+    def __init__(self, request_delay: float = 1.5, max_retries: int = 3, rate_limiter=None,
+                 session: Optional[requests.Session] = None):
         """
         Initialize the HTML retriever.
         
         Args:
             request_delay: Delay in seconds between requests (1-2 seconds recommended)
             max_retries: Maximum number of retry attempts for failed requests
+            rate_limiter: Optional shared limiter (e.g. TokenBucket). Without
+                one, a private limiter allowing one request per request_delay
+                is used, so concurrent retrievals keep the same pace
+            session: Optional shared session (see src.utils.http); when given,
+                the caller owns it and close() leaves it open
         """
         self.request_delay = request_delay
         self.max_retries = max_retries
+        if rate_limiter is None and request_delay > 0:
+            rate_limiter = TokenBucket(rate_per_sec=1.0 / request_delay, burst=1, jitter_ms=0)
+        self.rate_limiter = rate_limiter
         self.logger = logging.getLogger(__name__)
         
-        # Create a session with proper headers
-        self.session = requests.Session()
-        self.session.headers.update({
+        self._owns_session = session is None
+        self.session = session if session is not None else create_session()
+        # Sent per request so a shared session's defaults are left untouched
+        self.headers = {
             'User-Agent': 'Archaic/2.0 (Archival Web Scraper; Educational/Archival Use)',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
-        })
+        }
     
     def retrieve_page(self, 
                      wayback_url: str, 
                      original_url: str,
-                     progress_callback: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+                     progress_callback: Optional[Callable[[str], None]] = None,
+                     parse_stream: Optional[Callable[[Iterable[bytes], str], Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Retrieve HTML content from a Wayback Machine URL.
         
@@ -56,10 +93,14 @@ class HTMLRetriever:
             wayback_url: The full Wayback Machine URL to download
             original_url: The original URL (for logging and metadata)
             progress_callback: Optional callback function to report progress
+            parse_stream: Optional incremental parser (e.g.
+                HTMLCleaner.parse_stream) called with the body's byte chunks
+                and encoding as they arrive; its result is returned as 'tree'
+                instead of the decoded 'html'
             
         Returns:
             Dictionary containing:
-            - 'html': The raw HTML content
+            - 'html': The raw HTML content (or 'tree' with parse_stream)
             - 'url': The original URL
             - 'wayback_url': The Wayback Machine URL used
             - 'size': Size of the content in bytes
@@ -86,38 +127,75 @@ class HTMLRetriever:
                     delay = self.request_delay * (2 ** attempt)  # Exponential backoff
                     self.logger.info(f"Retry {attempt} after {delay:.1f}s delay")
                     time.sleep(delay)
-                else:
-                    time.sleep(self.request_delay)
                 
-                # Respect global rate limiter if present
+                # The rate limiter spaces requests across all threads
                 if self.rate_limiter:
                     self.rate_limiter.acquire()
-                # Make the request
-                response = self.session.get(wayback_url, timeout=30)
-                response.raise_for_status()
+                # Make the request; the body is read once as bytes and
+                # decoded once, with the connection released on exit
+                with self.session.get(wayback_url, headers=self.headers, timeout=30, stream=True) as response:
+                    # Error statuses are checked directly rather than raised
+                    # and caught as HTTPError; they are handled below, once the
+                    # connection has been released
+                    status_code = response.status_code
+                    if status_code < 400:
+                        # Validate content type
+                        content_type = response.headers.get('content-type', '').lower()
+                        if 'text/html' not in content_type:
+                            self.logger.warning(f"Non-HTML content type for {original_url}: {content_type}")
+                            # Continue anyway as some archives may have incorrect headers
+                    
+                        if parse_stream is not None:
+                            # Bytes go from the socket to the parser chunk by
+                            # chunk; the body is never held as one buffer
+                            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+                            head = next(chunks, b'')
+                            encoding = detect_html_encoding(content_type, head)
+                            counter = _ByteCounter(head, chunks)
+                            tree = parse_stream(counter, encoding)
+                            size = counter.size
+                        else:
+                            body = response.content
+                            size = len(body)
                 
-                # Validate content type
-                content_type = response.headers.get('content-type', '').lower()
-                if 'text/html' not in content_type:
-                    self.logger.warning(f"Non-HTML content type for {original_url}: {content_type}")
-                    # Continue anyway as some archives may have incorrect headers
+                if status_code >= 400:
+                    self.logger.warning(f"HTTP error {status_code} for {original_url} (attempt {attempt + 1})")
+                    
+                    # Don't retry on certain status codes
+                    if status_code in (404, 403, 410):
+                        self.logger.error(f"Permanent error {status_code} for {original_url}, not retrying")
+                        return None
+                    # Backoff more aggressively on 429/5xx
+                    if status_code == 429 or 500 <= status_code < 600:
+                        time.sleep(self.request_delay * (2 ** (attempt + 1)))
+                    if attempt >= self.max_retries:
+                        self.logger.error(f"Failed to retrieve {original_url} after {self.max_retries + 1} attempts: HTTP {status_code}")
+                        return None
+                    continue
                 
-                # Get the HTML content
-                html_content = response.text
+                if parse_stream is not None:
+                    content_ok = tree is not None and size >= 100
+                    content = {'tree': tree}
+                else:
+                    # Get the HTML content
+                    encoding = detect_html_encoding(content_type, body)
+                    html_content = body.decode(encoding, errors='replace')
+                    content_ok = bool(html_content) and len(html_content.strip()) >= 100
+                    content = {'html': html_content}
                 
                 # Validate content
-                if not html_content or len(html_content.strip()) < 100:
+                if not content_ok:
                     self.logger.warning(f"Retrieved content seems too short for {original_url}")
                     if attempt < self.max_retries:
                         continue  # Retry
                 
                 # Success - return the content
                 result = {
-                    'html': html_content,
+                    **content,
                     'url': original_url,
                     'wayback_url': wayback_url,
-                    'size': len(html_content.encode('utf-8')),
-                    'encoding': response.encoding or 'utf-8'
+                    'size': size,
+                    'encoding': encoding
                 }
                 
                 self.logger.info(f"Successfully retrieved {result['size']} bytes for {original_url}")
@@ -129,21 +207,6 @@ class HTMLRetriever:
                     self.logger.error(f"Failed to retrieve {original_url} after {self.max_retries + 1} attempts: Timeout")
                     return None
                     
-            except requests.exceptions.HTTPError as e:
-                status_code = e.response.status_code if e.response else 'unknown'
-                self.logger.warning(f"HTTP error {status_code} for {original_url} (attempt {attempt + 1})")
-                
-                # Don't retry on certain status codes
-                if status_code in [404, 403, 410]:
-                    self.logger.error(f"Permanent error {status_code} for {original_url}, not retrying")
-                    return None
-                # Backoff more aggressively on 429/5xx
-                if isinstance(status_code, int) and (status_code == 429 or 500 <= status_code < 600):
-                    time.sleep(self.request_delay * (2 ** (attempt + 1)))
-                if attempt >= self.max_retries:
-                    self.logger.error(f"Failed to retrieve {original_url} after {self.max_retries + 1} attempts: HTTP {status_code}")
-                    return None
-                    
             except requests.exceptions.RequestException as e:
                 self.logger.warning(f"Request error for {original_url} (attempt {attempt + 1}): {e}")
                 if attempt >= self.max_retries:
@@ -162,50 +225,58 @@ class HTMLRetriever:
         Returns:
             True if the URL appears to be a valid Wayback Machine URL
         """
-        try:
-            parsed = urlparse(url)
-            return (
-                parsed.scheme in ['http', 'https'] and
-                'web.archive.org' in parsed.netloc and
-                '/web/' in parsed.path
-            )
-        except Exception:
+        if not isinstance(url, str):
             return False
+        m = _URL_PARTS_RE.match(url)
+        return m is not None and 'web.archive.org' in m.group(1) and '/web/' in m.group(2)
     
     def retrieve_multiple(self, 
                          url_list: list, 
-                         progress_callback: Optional[Callable[[int, int, str], None]] = None) -> list:
+                         progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                         max_workers: int = DEFAULT_RETRIEVE_WORKERS) -> list:
         """
         Retrieve HTML content for multiple URLs.
         
+        Pages are downloaded on a thread pool over the shared session; the
+        rate limiter keeps the overall request rate unchanged.
+        
         Args:
             url_list: List of dictionaries with 'wayback_url' and 'url' keys
             progress_callback: Optional callback function with signature (current, total, status)
+            max_workers: Maximum concurrent downloads
             
         Returns:
-            List of successful retrieval results
+            List of successful retrieval results, in url_list order
         """
-        results = []
         total = len(url_list)
+        results: list = [None] * total
         
         self.logger.info(f"Starting batch retrieval of {total} URLs")
+        if not url_list:
+            return []
         
-        for i, url_info in enumerate(url_list, 1):
-            wayback_url = url_info.get('wayback_url')
-            original_url = url_info.get('url', wayback_url)
-            
-            if progress_callback:
-                progress_callback(i, total, f"Processing {original_url}")
-            
-            result = self.retrieve_page(wayback_url, original_url)
-            if result:
-                results.append(result)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as ex:
+            futures = {}
+            for i, url_info in enumerate(url_list):
+                wayback_url = url_info.get('wayback_url')
+                original_url = url_info.get('url', wayback_url)
+                futures[ex.submit(self.retrieve_page, wayback_url, original_url)] = (i, original_url)
             
-            # Additional progress update after each retrieval
-            if progress_callback:
-                status = "✓ Success" if result else "✗ Failed"
-                progress_callback(i, total, f"{status}: {original_url}")
+            # Progress is reported from this thread as downloads finish
+            for done, fut in enumerate(as_completed(futures), 1):
+                i, original_url = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    self.logger.error(f"Unexpected error retrieving {original_url}: {e}")
+                    result = None
+                results[i] = result
+                
+                if progress_callback:
+                    status = "✓ Success" if result else "✗ Failed"
+                    progress_callback(done, total, f"{status}: {original_url}")
         
+        results = [r for r in results if r]
         success_count = len(results)
         failure_count = total - success_count
         
@@ -223,7 +294,7 @@ class HTMLRetriever:
         test_url = "https://web.archive.org/web/20230101000000/https://example.com"
         
         try:
-            response = self.session.head(test_url, timeout=10)
+            response = self.session.head(test_url, headers=self.headers, timeout=10)
             return response.status_code in [200, 404]  # 404 is also OK, means connection works
         except Exception as e:
             self.logger.error(f"Connection test failed: {e}")
@@ -239,12 +310,11 @@ class HTMLRetriever:
         return {
             'request_delay': self.request_delay,
             'max_retries': self.max_retries,
-            'user_agent': self.session.headers.get('User-Agent')
+            'user_agent': self.headers.get('User-Agent')
         }
-        # Optional global rate limiter
-        self.rate_limiter = rate_limiter
     
     def close(self):
-        """Close the HTTP session."""
-        self.session.close()
-        self.logger.info("HTML retriever session closed")
+        """Close the HTTP session unless it is shared with other components."""
+        if self._owns_session:
+            self.session.close()
+            self.logger.info("HTML retriever session closed")
@@ -5,15 +5,150 @@ This module provides centralized logging configuration and error handling
 utilities for the Archaic web scraper application.
 """
 
+import atexit
+import itertools
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import stat
 import sys
+import threading
+import time
+import weakref
+from collections import Counter, deque
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, Dict, Any
 import traceback
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+# Buffered ErrorTracker records are written out once this many are pending,
+# and otherwise by a timer at most ERROR_FLUSH_INTERVAL seconds after the last
+# write (so the first record after a quiet spell is written at once)
+ERROR_FLUSH_THRESHOLD = 32
+ERROR_FLUSH_INTERVAL = 5.0
+# Most recent errors and warnings an ErrorTracker keeps (counts cover all)
+MAX_RETAINED_RECORDS = 10_000
+
+# Trackers still alive at exit get their pending records flushed by one hook,
+# registered with the first tracker (so after the logger's own shutdown hook,
+# and run before it); the set does not keep trackers alive
+_live_trackers: "weakref.WeakSet" = weakref.WeakSet()
+_exit_hook_lock = threading.Lock()
+_exit_hook_registered = False
+
+
+def _flush_live_trackers() -> None:
+    for tracker in list(_live_trackers):
+        tracker.flush()
+
+
+def _track_for_exit(tracker: "ErrorTracker") -> None:
+    global _exit_hook_registered
+    with _exit_hook_lock:
+        _live_trackers.add(tracker)
+        if not _exit_hook_registered:
+            atexit.register(_flush_live_trackers)
+            _exit_hook_registered = True
+
+
+def _json_default(value):
+    """Serialize values json can't: datetimes as ISO 8601, anything else as text."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _json_line(record: Dict[str, Any]) -> bytes:
+    """One JSONL line for an error or warning record."""
+    if orjson is not None:
+        return orjson.dumps(record, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, default=_json_default, ensure_ascii=False) + '\n').encode('utf-8')
+
+# The main log file is written through a buffer of this size and flushed
+# for every WARNING+ record, every LOG_FLUSH_EVERY records, or when
+# LOG_FLUSH_INTERVAL seconds have passed since the last flush
+LOG_BUFFER_SIZE = 64 * 1024
+LOG_FLUSH_EVERY = 128
+LOG_FLUSH_INTERVAL = 1.0
+
+# No formatter here uses thread or process names, so LogRecord skips them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+
+def _skip_find_caller(*args, **kwargs):
+    """findCaller replacement for loggers whose output never shows the caller."""
+    return "(unknown file)", 0, "(unknown function)", None
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for an in-process queue. Only the message arguments are
+    merged on the calling thread; exception info is left on the record so
+    the listener's handlers format tracebacks off the hot path, and only
+    when one of them emits the record.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that batches flushes instead of flushing every
+    record, and tracks the file size itself: the stock rollover check
+    stats the path, formats the record a second time and seeks (flushing
+    the stream) for every record.
+    """
+    
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE,
+                      encoding=self.encoding, errors=self.errors)
+        st = os.fstat(stream.fileno())
+        self._size = st.st_size
+        # Never roll over anything other than a regular file (bpo-45401)
+        self._regular = stat.S_ISREG(st.st_mode)
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        return stream
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self._regular and self._size + len(msg) >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._size += len(msg)
+            self._unflushed += 1
+            if (record.levelno >= logging.WARNING or self._unflushed >= LOG_FLUSH_EVERY
+                    or time.monotonic() - self._last_flush >= LOG_FLUSH_INTERVAL):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self) -> None:
+        super().flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
 
 class ArchaicLogger:
     """
@@ -34,6 +169,9 @@ class ArchaicLogger:
         self.log_dir = Path(log_dir)
         self.app_name = app_name
         self.loggers: Dict[str, logging.Logger] = {}
+        # Module loggers by the short name passed to get_logger
+        self._module_loggers: Dict[str, logging.Logger] = {}
+        self._listener: Optional[logging.handlers.QueueListener] = None
         
         # Ensure log directory exists
         self.log_dir.mkdir(exist_ok=True)
@@ -45,6 +183,10 @@ class ArchaicLogger:
         """
         Set up the main application logger with file and console handlers.
         
+        The logger itself only enqueues records; a background listener
+        thread owns the handlers, so formatting, file writes and rotation
+        never run on the logging thread.
+        
         Args:
             level: Logging level (default: INFO)
             
@@ -59,7 +201,12 @@ class ArchaicLogger:
         if logger.handlers:
             return logger
         
-        # Create formatters
+        # Create formatters; only the error log shows the calling function
+        file_formatter = logging.Formatter(
+            '%(asctime)s | %(name)s | %(levelname)s | %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        
         detailed_formatter = logging.Formatter(
             '%(asctime)s | %(name)s | %(levelname)s | %(funcName)s:%(lineno)d | %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
@@ -72,14 +219,14 @@ class ArchaicLogger:
         
         # File handler with rotation
         log_file = self.log_dir / f"{self.app_name}.log"
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = _BufferedRotatingFileHandler(
             log_file,
             maxBytes=10*1024*1024,  # 10MB
             backupCount=5,
             encoding='utf-8'
         )
         file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(detailed_formatter)
+        file_handler.setFormatter(file_formatter)
         
         # Console handler
         console_handler = logging.StreamHandler(sys.stdout)
@@ -97,10 +244,15 @@ class ArchaicLogger:
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(detailed_formatter)
         
-        # Add handlers to logger
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        logger.addHandler(error_handler)
+        # Hand records to the listener thread that owns the handlers
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(_RecordQueueHandler(log_queue))
+        self._listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, error_handler,
+            respect_handler_level=True
+        )
+        self._listener.start()
+        atexit.register(self.shutdown)
         
         self.loggers['main'] = logger
         return logger
@@ -115,14 +267,16 @@ class ArchaicLogger:
         Returns:
             Logger instance for the module
         """
-        full_name = f"{self.app_name}.{name}"
-        
-        if full_name not in self.loggers:
-            logger = logging.getLogger(full_name)
-            logger.setLevel(logging.DEBUG)
-            self.loggers[full_name] = logger
+        logger = self._module_loggers.get(name)
+        if logger is not None:
+            return logger
         
-        return self.loggers[full_name]
+        full_name = f"{self.app_name}.{name}"
+        logger = logging.getLogger(full_name)
+        logger.setLevel(logging.DEBUG)
+        self.loggers[full_name] = logger
+        self._module_loggers[name] = logger
+        return logger
     
     def create_session_log(self, session_id: str) -> str:
         """
@@ -140,6 +294,10 @@ class ArchaicLogger:
         # Create session logger
         session_logger = logging.getLogger(f"{self.app_name}.session.{session_id}")
         session_logger.setLevel(logging.DEBUG)
+        # Neither the session nor the main log format shows the caller, so
+        # the per-record frame walk is skipped (the error log shows
+        # "(unknown function)" for session records)
+        session_logger.findCaller = _skip_find_caller
         
         # Session file handler
         session_handler = logging.FileHandler(session_log_file, encoding='utf-8')
@@ -151,31 +309,66 @@ class ArchaicLogger:
         )
         session_handler.setFormatter(session_formatter)
         
-        session_logger.addHandler(session_handler)
+        if self._listener is not None:
+            # Session records reach the listener through the main logger's
+            # queue; the filter keeps other records out of the session file
+            session_handler.addFilter(logging.Filter(session_logger.name))
+            self._listener.handlers = self._listener.handlers + (session_handler,)
+        else:
+            session_logger.addHandler(session_handler)
         self.loggers[f"session.{session_id}"] = session_logger
         
         return str(session_log_file)
     
+    def shutdown(self):
+        """Stop the listener thread once queued records have been written."""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+    
     def log_system_info(self):
         """Log system information for debugging."""
         logger = self.get_logger('system')
         
         logger.info("=== Archaic Application Started ===")
-        logger.info(f"Python version: {sys.version}")
-        logger.info(f"Platform: {sys.platform}")
-        logger.info(f"Working directory: {os.getcwd()}")
-        logger.info(f"Log directory: {self.log_dir.absolute()}")
+        logger.info("Python version: %s", sys.version)
+        logger.info("Platform: %s", sys.platform)
+        logger.info("Working directory: %s", os.getcwd())
+        logger.info("Log directory: %s", self.log_dir.absolute())
 
 
 class ErrorTracker:
     """
     Tracks and categorizes errors that occur during operation.
+    
+    Records are kept immediately, but their log lines are buffered and
+    written in batches, so a burst of failures does not pay for level checks
+    and traceback formatting per error. A batch is written once
+    ERROR_FLUSH_THRESHOLD records are pending or, failing that, by a timer
+    within ERROR_FLUSH_INTERVAL; each record still gets its own log line.
     """
     
     def __init__(self, logger: logging.Logger):
         self.logger = logger
-        self.errors: list = []
-        self.warnings: list = []
+        # Only the newest records are retained; totals and per-type counts
+        # are kept separately so they still cover every record
+        self.errors: deque = deque(maxlen=MAX_RETAINED_RECORDS)
+        self.warnings: deque = deque(maxlen=MAX_RETAINED_RECORDS)
+        self._error_seq = 0
+        self._warning_seq = 0
+        # IDs share one prefix taken when the tracker is created, so logging
+        # an entry only formats its sequence number
+        self._id_prefix = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self._type_counts: Counter = Counter()
+        self._pending_errors: list = []
+        self._pending_warnings: list = []
+        self._last_flush = 0.0
+        self._flush_threshold = ERROR_FLUSH_THRESHOLD
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        _track_for_exit(self)
     
     def log_error(self, 
                   error: Exception, 
@@ -194,30 +387,36 @@ class ErrorTracker:
         Returns:
             Error ID for tracking
         """
-        error_id = f"ERR_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self.errors):03d}"
-        
-        error_data = {
-            'id': error_id,
-            'timestamp': datetime.now(),
-            'type': type(error).__name__,
-            'message': str(error),
-            'context': context,
-            'url': url,
-            'traceback': traceback.format_exc(),
-            'additional_info': additional_info or {}
-        }
+        now = time.time()
         
-        self.errors.append(error_data)
-        
-        # Log the error
-        log_message = f"[{error_id}] {error_data['type']}: {error_data['message']}"
-        if context:
-            log_message += f" (Context: {context})"
-        if url:
-            log_message += f" (URL: {url})"
+        with self._lock:
+            error_id = f"ERR_{self._id_prefix}_{self._error_seq:03d}"
+            self._error_seq += 1
+            type_name = type(error).__name__
+            self._type_counts[type_name] += 1
+            
+            # The stack is captured now (without reading source lines or
+            # holding frames) and only turned into text when a summary or
+            # report needs it; the log handlers format their own copy from
+            # exc_info, and only if they emit the record
+            error_data = {
+                'id': error_id,
+                'timestamp': now,
+                'type': type_name,
+                'message': str(error),
+                'context': context,
+                'url': url,
+                'traceback': traceback.TracebackException(type(error), error, error.__traceback__,
+                                                          lookup_lines=False),
+                'additional_info': additional_info or {}
+            }
+            
+            self.errors.append(error_data)
+            self._pending_errors.append((error_data, error))
+            flush = self._due()
         
-        self.logger.error(log_message)
-        self.logger.debug(f"[{error_id}] Full traceback:\n{error_data['traceback']}")
+        if flush:
+            self.flush()
         
         return error_id
     
@@ -236,29 +435,75 @@ class ErrorTracker:
         Returns:
             Warning ID for tracking
         """
-        warning_id = f"WARN_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self.warnings):03d}"
-        
-        warning_data = {
-            'id': warning_id,
-            'timestamp': datetime.now(),
-            'message': message,
-            'context': context,
-            'url': url
-        }
+        now = time.time()
         
-        self.warnings.append(warning_data)
-        
-        # Log the warning
-        log_message = f"[{warning_id}] {message}"
-        if context:
-            log_message += f" (Context: {context})"
-        if url:
-            log_message += f" (URL: {url})"
+        with self._lock:
+            warning_id = f"WARN_{self._id_prefix}_{self._warning_seq:03d}"
+            self._warning_seq += 1
+            
+            warning_data = {
+                'id': warning_id,
+                'timestamp': now,
+                'message': message,
+                'context': context,
+                'url': url
+            }
+            
+            self.warnings.append(warning_data)
+            self._pending_warnings.append(warning_data)
+            flush = self._due()
         
-        self.logger.warning(log_message)
+        if flush:
+            self.flush()
         
         return warning_id
     
+    def flush(self):
+        """Write out buffered errors and warnings, one log line per record."""
+        with self._lock:
+            pending_errors, self._pending_errors = self._pending_errors, []
+            pending_warnings, self._pending_warnings = self._pending_warnings, []
+            self._last_flush = time.monotonic()
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        
+        # Levels are checked once per batch; lines are only built if the
+        # logger would emit them
+        if pending_errors and self.logger.isEnabledFor(logging.ERROR):
+            for error_data, error in pending_errors:
+                # Handler levels decide whether the traceback is written
+                self.logger.error(self._log_line(error_data, f"{error_data['type']}: {error_data['message']}"),
+                                  exc_info=error)
+        if pending_warnings and self.logger.isEnabledFor(logging.WARNING):
+            for warning_data in pending_warnings:
+                self.logger.warning(self._log_line(warning_data, warning_data['message']))
+    
+    def _due(self) -> bool:
+        """
+        Whether the buffer should be flushed now; called with the lock held.
+        If not, a timer is armed (once per batch) so the pending records are
+        still written within ERROR_FLUSH_INTERVAL when nothing else is logged.
+        """
+        pending = len(self._pending_errors) + len(self._pending_warnings)
+        wait = ERROR_FLUSH_INTERVAL - (time.monotonic() - self._last_flush)
+        if pending >= self._flush_threshold or wait <= 0:
+            return True
+        if self._timer is None:
+            self._timer = threading.Timer(wait, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return False
+    
+    @staticmethod
+    def _log_line(data: Dict[str, Any], text: str) -> str:
+        line = f"[{data['id']}] {text}"
+        if data['context']:
+            line += f" (Context: {data['context']})"
+        if data['url']:
+            line += f" (URL: {data['url']})"
+        return line
+    
     def get_error_summary(self) -> Dict[str, Any]:
         """
         Get a summary of all errors and warnings.
@@ -266,67 +511,105 @@ class ErrorTracker:
         Returns:
             Dictionary with error statistics and details
         """
+        self.flush()
+        recent_errors = self._recent(self.errors)
+        for error_data in recent_errors:
+            self._format_traceback(error_data)
         return {
-            'total_errors': len(self.errors),
-            'total_warnings': len(self.warnings),
+            'total_errors': self._error_seq,
+            'total_warnings': self._warning_seq,
             'error_types': self._count_error_types(),
-            'recent_errors': self.errors[-5:] if self.errors else [],
-            'recent_warnings': self.warnings[-5:] if self.warnings else []
+            'recent_errors': recent_errors,
+            'recent_warnings': self._recent(self.warnings)
         }
     
     def _count_error_types(self) -> Dict[str, int]:
         """Count errors by type."""
-        type_counts = {}
-        for error in self.errors:
-            error_type = error['type']
-            type_counts[error_type] = type_counts.get(error_type, 0) + 1
-        return type_counts
+        return dict(self._type_counts)
+    
+    @staticmethod
+    def _format_traceback(error_data: Dict[str, Any]) -> None:
+        """Replace a record's captured stack with its traceback text (once)."""
+        tb = error_data['traceback']
+        if isinstance(tb, traceback.TracebackException):
+            error_data['traceback'] = ''.join(tb.format())
+    
+    @staticmethod
+    def _recent(records: deque, n: int = 5) -> list:
+        """The last n records, oldest first, without copying the deque."""
+        return list(itertools.islice(reversed(records), n))[::-1]
     
     def save_error_report(self, output_path: str):
         """
-        Save a detailed error report to a file.
+        Save the retained errors and warnings as JSON Lines, one record per
+        line (errors first). Use format_text_report for a readable version.
         
         Args:
             output_path: Path where the report should be saved
         """
+        self.flush()
+        for error_data in self.errors:
+            self._format_traceback(error_data)
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write("ARCHAIC ERROR REPORT\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Total Errors: {len(self.errors)}\n")
-                f.write(f"Total Warnings: {len(self.warnings)}\n\n")
-                
-                if self.errors:
-                    f.write("ERRORS:\n")
-                    f.write("-" * 30 + "\n")
-                    for error in self.errors:
-                        f.write(f"\n[{error['id']}] {error['timestamp']}\n")
-                        f.write(f"Type: {error['type']}\n")
-                        f.write(f"Message: {error['message']}\n")
-                        if error['context']:
-                            f.write(f"Context: {error['context']}\n")
-                        if error['url']:
-                            f.write(f"URL: {error['url']}\n")
-                        f.write(f"Traceback:\n{error['traceback']}\n")
-                        f.write("-" * 50 + "\n")
-                
-                if self.warnings:
-                    f.write("\nWARNINGS:\n")
-                    f.write("-" * 30 + "\n")
-                    for warning in self.warnings:
-                        f.write(f"\n[{warning['id']}] {warning['timestamp']}\n")
-                        f.write(f"Message: {warning['message']}\n")
-                        if warning['context']:
-                            f.write(f"Context: {warning['context']}\n")
-                        if warning['url']:
-                            f.write(f"URL: {warning['url']}\n")
-                        f.write("-" * 30 + "\n")
+            with open(output_path, 'wb') as f:
+                # Timestamps are kept as epoch seconds and only turned into
+                # dates here
+                f.write(b''.join(
+                    _json_line({**record, 'timestamp': datetime.fromtimestamp(record['timestamp'])})
+                    for record in itertools.chain(self.errors, self.warnings)))
             
-            self.logger.info(f"Error report saved to: {output_path}")
+            self.logger.info("Error report saved to: %s", output_path)
             
         except Exception as e:
-            self.logger.error(f"Failed to save error report: {e}")
+            self.logger.error("Failed to save error report: %s", e)
+
+
+def format_text_report(report_path: str) -> str:
+    """
+    Render a JSONL report written by ErrorTracker.save_error_report in the
+    human-readable layout.
+    """
+    errors, warnings = [], []
+    with open(report_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                (warnings if record['id'].startswith('WARN_') else errors).append(record)
+    
+    parts = [
+        "ARCHAIC ERROR REPORT\n",
+        "=" * 50 + "\n\n",
+        f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        f"Total Errors: {len(errors)}\n",
+        f"Total Warnings: {len(warnings)}\n\n",
+    ]
+    
+    if errors:
+        parts.append("ERRORS:\n" + "-" * 30 + "\n")
+        for error in errors:
+            parts.append(f"\n[{error['id']}] {error['timestamp']}\n"
+                         f"Type: {error['type']}\n"
+                         f"Message: {error['message']}\n")
+            if error['context']:
+                parts.append(f"Context: {error['context']}\n")
+            if error['url']:
+                parts.append(f"URL: {error['url']}\n")
+            if error['traceback']:
+                parts.append(f"Traceback:\n{error['traceback']}\n")
+            parts.append("-" * 50 + "\n")
+    
+    if warnings:
+        parts.append("\nWARNINGS:\n" + "-" * 30 + "\n")
+        for warning in warnings:
+            parts.append(f"\n[{warning['id']}] {warning['timestamp']}\n"
+                         f"Message: {warning['message']}\n")
+            if warning['context']:
+                parts.append(f"Context: {warning['context']}\n")
+            if warning['url']:
+                parts.append(f"URL: {warning['url']}\n")
+            parts.append("-" * 30 + "\n")
+    
+    return ''.join(parts)
 
 
 # Global logger instance
@@ -348,10 +631,13 @@ def get_logger(name: str = None) -> logging.Logger:
     if _logger_instance is None:
         _logger_instance = ArchaicLogger()
     
-    if name:
-        return _logger_instance.get_logger(name)
-    else:
-        return _logger_instance.get_logger('main')
+    return _cached_logger(name or 'main')
+
+
+@lru_cache(maxsize=256)
+def _cached_logger(name: str) -> logging.Logger:
+    """Module loggers of the global instance; cleared when it is replaced."""
+    return _logger_instance.get_logger(name)
 
 
 def initialize_logging(log_dir: str = "logs", level: int = logging.INFO):
@@ -364,6 +650,7 @@ def initialize_logging(log_dir: str = "logs", level: int = logging.INFO):
     """
     global _logger_instance
     _logger_instance = ArchaicLogger(log_dir)
+    _cached_logger.cache_clear()
     _logger_instance.setup_logger(level)
     _logger_instance.log_system_info()
 
@@ -8,56 +8,166 @@ url_fetcher that denies http(s) requests to ensure offline rendering.
 """
 
 import logging
+import mimetypes
+import multiprocessing
 import os
-from typing import Optional, Dict, Any
-
-try:
-    from weasyprint import HTML
-except Exception:  # pragma: no cover - handled at runtime
-    HTML = None
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+
+# WeasyPrint is imported on first use: importing it loads cairo and pango
+# through cffi, which is slow and pointless for processes that never render
+HTML = None
+_weasyprint_checked = False
+
+
+def _load_weasyprint() -> bool:
+    """Import WeasyPrint once; return True if it is usable."""
+    global HTML, _weasyprint_checked
+    if not _weasyprint_checked:
+        try:
+            from weasyprint import HTML as weasyprint_html
+        except Exception:  # pragma: no cover - handled at runtime
+            weasyprint_html = None
+        HTML = weasyprint_html
+        _weasyprint_checked = True
+    return HTML is not None
+
+
+# Resources up to this size are kept in memory between renders; larger ones
+# are streamed from disk each time
+CACHED_RESOURCE_MAX_BYTES = 1024 * 1024
+# Total bytes the in-memory resource cache may hold
+RESOURCE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Keyed by file identity rather than path: every page has its own assets
+# directory, but fonts and images there are hard links into the shared asset
+# cache, so the same file under different pages' paths is read once
+_resource_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_resource_cache_bytes = 0
+_resource_cache_lock = threading.Lock()
+
+
+def _read_cached(abs_path: str, st: os.stat_result) -> bytes:
+    """Contents of abs_path (whose stat is st); edited files are re-read."""
+    global _resource_cache_bytes
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    with _resource_cache_lock:
+        data = _resource_cache.get(key)
+        if data is not None:
+            _resource_cache.move_to_end(key)
+            return data
+    with open(abs_path, 'rb') as f:
+        data = f.read()
+    with _resource_cache_lock:
+        if key not in _resource_cache:
+            _resource_cache[key] = data
+            _resource_cache_bytes += len(data)
+            while _resource_cache_bytes > RESOURCE_CACHE_MAX_BYTES:
+                _, evicted = _resource_cache.popitem(last=False)
+                _resource_cache_bytes -= len(evicted)
+    return data
+
+
+@lru_cache(maxsize=256)
+def _guess_mime(abs_path: str) -> Optional[str]:
+    return mimetypes.guess_type(abs_path)[0]
+
+
+_REMOTE_PREFIXES = ('http://', 'https://')
+
+# Per-process engine used by _render_one (one per pool worker)
+_process_engine: Optional["WeasyPrintEngine"] = None
+
+
+def _render_one(html_content: str, output_path: str, base_url: Optional[str] = None) -> bool:
+    """Pool worker entry point for generate_many; mirrors generate()."""
+    global _process_engine
+    if _process_engine is None:
+        _process_engine = WeasyPrintEngine()
+    return _process_engine.generate(html_content, output_path, base_url)
 
 
 class WeasyPrintEngine:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._ensured_dirs = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-    def _local_only_fetcher(self, allowed_base: Optional[str] = None):
+    def _local_only_fetcher(self, allowed_base: Optional[str] = None, opened: Optional[List] = None):
         """
         Return a url_fetcher for WeasyPrint that only allows local file paths.
         Optionally restrict under an allowed_base directory.
+
+        Small resources (the stylesheets, fonts and logos shared by most pages)
+        are served from an in-memory cache. Larger ones are handed over as
+        open files rather than read into memory first; each file is appended
+        to opened (when given) so the caller can make sure it is closed once
+        rendering is done.
         """
+        # Bound once here; the fetchers below run for every resource
+        abspath = os.path.abspath
+        stat = os.stat
+        read_cached = _read_cached
+        guess_mime = _guess_mime
 
-        def fetch(url):
-            # Deny any remote fetches
-            if url.startswith('http://') or url.startswith('https://'):
-                raise RuntimeError(f"Remote fetch blocked: {url}")
-            if url.startswith('file://'):
-                path = url[7:]
-            else:
-                # Treat bare paths as local
-                path = url
-            # Normalize and enforce base if provided
-            abs_path = os.path.abspath(path)
-            if allowed_base:
-                base = os.path.abspath(allowed_base)
-                if not abs_path.startswith(base):
-                    raise RuntimeError(f"Access outside allowed base blocked: {url}")
+        def load(abs_path, url):
             try:
-                with open(abs_path, 'rb') as f:
-                    data = f.read()
-                return {
-                    'string': data,
-                    'mime_type': None,  # Let WeasyPrint infer
-                    'encoding': 'binary'
-                }
+                st = stat(abs_path)
+                if st.st_size <= CACHED_RESOURCE_MAX_BYTES:
+                    return {
+                        'string': read_cached(abs_path, st),
+                        'mime_type': guess_mime(abs_path),  # None lets WeasyPrint infer
+                    }
+                f = open(abs_path, 'rb')
             except Exception as e:
                 raise RuntimeError(f"Failed to read local resource: {url} ({e})")
+            if opened is not None:
+                opened.append(f)
+            return {
+                'file_obj': f,
+                'mime_type': guess_mime(abs_path),
+            }
+
+        # allowed_base is fixed for the document, so the fetcher is built
+        # with or without the base check instead of testing for it per call
+        if not allowed_base:
+            def fetch(url):
+                # Deny any remote fetches
+                if url.startswith(_REMOTE_PREFIXES):
+                    raise RuntimeError(f"Remote fetch blocked: {url}")
+                # Treat bare paths as local
+                path = url[7:] if url.startswith('file://') else url
+                return load(abspath(path), url)
 
-        return fetch
+            return fetch
+
+        # Normalized once per document rather than per fetched resource; the
+        # trailing separator keeps /foo from admitting /foobar
+        base = os.path.join(os.path.abspath(allowed_base), '')
+
+        def fetch_within_base(url):
+            if url.startswith(_REMOTE_PREFIXES):
+                raise RuntimeError(f"Remote fetch blocked: {url}")
+            path = url[7:] if url.startswith('file://') else url
+            abs_path = abspath(path)
+            if not (abs_path + os.sep).startswith(base):
+                raise RuntimeError(f"Access outside allowed base blocked: {url}")
+            return load(abs_path, url)
+
+        return fetch_within_base
 
     def available(self) -> bool:
         """Return True if WeasyPrint is importable."""
-        return HTML is not None
+        return _load_weasyprint()
 
     def generate(self, html_content: str, output_path: str, base_url: Optional[str] = None) -> bool:
         """
@@ -68,20 +178,54 @@ class WeasyPrintEngine:
             output_path: Target PDF path
             base_url: Base directory for resolving relative resources
         """
-        if HTML is None:
+        if not _load_weasyprint():
             self.logger.error("WeasyPrint is not installed. Please install 'weasyprint'.")
             return False
 
+        opened: List = []
         try:
-            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            self._ensure_dir(os.path.dirname(os.path.abspath(output_path)))
 
             # Constrain fetcher to local only (and within base_url when provided)
-            url_fetcher = self._local_only_fetcher(allowed_base=base_url)
+            url_fetcher = self._local_only_fetcher(allowed_base=base_url, opened=opened)
             html = HTML(string=html_content, base_url=base_url, url_fetcher=url_fetcher)
+            # write_pdf raises on failure, so the file need not be checked
             html.write_pdf(output_path)
-
-            return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+            return True
         except Exception as e:
-            self.logger.error(f"WeasyPrint generation failed: {e}")
+            self.logger.error("WeasyPrint generation failed: %s", e)
             return False
+        finally:
+            # WeasyPrint closes the files it finishes reading; this covers
+            # any left open by a failed render
+            for f in opened:
+                f.close()
+
+    def _ensure_dir(self, path: str) -> None:
+        """Create path once per engine; later renders into it skip the mkdir."""
+        if path not in self._ensured_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._ensured_dirs.add(path)
+
+    def generate_many(self, jobs: Iterable[Tuple[str, str, Optional[str]]],
+                      max_workers: Optional[int] = None) -> List[Future]:
+        """
+        Render several documents in worker processes.
 
+        Rendering is CPU-bound and holds the GIL, so bulk jobs are spread
+        over a process pool (created on first use and kept until close()).
+        Each job is an (html_content, output_path, base_url) tuple; the
+        returned futures resolve to generate()'s result, in job order.
+        """
+        if self._pool is None:
+            # spawn avoids forking a process that has live threads
+            self._pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return [self._pool.submit(_render_one, html_content, output_path, base_url)
+                for html_content, output_path, base_url in jobs]
+
+    def close(self):
+        """Shut down the generate_many worker pool, if one was started."""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
@@ -6,21 +6,117 @@ engine. ReportLab implementation has been deprecated in favor of higher-fidelity
 rendering and simpler dependency story for HTML/CSS support.
 """
 
+import hashlib
 import logging
 import os
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
 from typing import Optional, Dict, Any
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
 
 from .pdf_engines.weasyprint_engine import WeasyPrintEngine
 
 
+# Only these elements (with their subtrees) are built when the fallback
+# renderer or get_metadata parses a page; scripts, styles and links in
+# <head> are skipped
+_SOUP_STRAINER = SoupStrainer(['title', 'meta', 'body'])
+
+# Parsed pages kept per generator, so get_metadata and generate_pdf on the
+# same page (in either order) share one parse
+PARSE_CACHE_SIZE = 8
+
+# Block elements the ReportLab fallback turns into paragraphs: tag -> (style
+# name, space after, bullet). Other elements are walked through for their
+# children.
+_FALLBACK_BLOCKS = {
+    'h1': ('Heading1', 8, None),
+    'h2': ('Heading2', 6, None),
+    'h3': ('Heading3', 6, None),
+    'h4': ('Heading4', 6, None),
+    'h5': ('Heading5', 6, None),
+    'h6': ('Heading6', 6, None),
+    'p': ('Normal', 6, None),
+    'li': ('CustomListItem', 0, '\u2022'),
+}
+
+# Inline elements kept as ReportLab paragraph markup by the fallback
+_INLINE_MARKUP = {'b': 'b', 'strong': 'b', 'i': 'i', 'em': 'i', 'u': 'u'}
+_INLINE_TAGS = list(_INLINE_MARKUP)
+
+# ReportLab parses Paragraph text as markup, so page text is escaped first
+_HTML_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+# Per-process generator used by render_pdf (one per pool worker)
+_process_generator: Optional["PDFGenerator"] = None
+
+
+def render_pdf(html_content: str,
+               output_path: str,
+               title: str = None,
+               original_url: str = None,
+               base_url: Optional[str] = None) -> bool:
+    """
+    Module-level entry point for rendering in a worker process.
+
+    PDF rendering is CPU-bound and holds the GIL, so the controller submits
+    this function to a ProcessPoolExecutor; arguments and result are plain
+    picklable values.
+    """
+    global _process_generator
+    if _process_generator is None:
+        _process_generator = PDFGenerator()
+    return _process_generator.generate_pdf(html_content, output_path, title=title,
+                                           original_url=original_url, base_url=base_url)
+
+
+def _escape_html(text) -> str:
+    """Escape text for a ReportLab Paragraph in one pass."""
+    if not isinstance(text, str):
+        text = str(text)
+    return text.translate(_HTML_ESCAPE_TABLE)
+
+
+def _formatted_text(element) -> str:
+    """Escaped paragraph markup for element, keeping bold/italic/underline."""
+    parts = []
+    for child in element.children:
+        name = child.name
+        if name is None:
+            # Comments and other special strings are dropped, as get_text does
+            if type(child) is NavigableString:
+                parts.append(_escape_html(child))
+            continue
+        inner = _formatted_text(child)
+        tag = _INLINE_MARKUP.get(name)
+        parts.append(f"<{tag}>{inner}</{tag}>" if tag and inner else inner)
+    return ''.join(parts)
+
+
+@lru_cache(maxsize=None)
+def _fallback_styles():
+    """
+    ReportLab stylesheet for the fallback renderer, built once per process
+    with the custom list item style registered alongside the sample styles.
+    """
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='CustomListItem', parent=styles['Normal'],
+                              fontSize=10, leftIndent=24, spaceAfter=6))
+    return styles
+
+
 class PDFGenerator:
     """Generates PDF files from cleaned HTML content using WeasyPrint."""
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.engine = WeasyPrintEngine()
+        # Recent parses keyed by a digest of the page, least recent first
+        self._parse_cache: "OrderedDict[bytes, BeautifulSoup]" = OrderedDict()
 
     def generate_pdf(self,
                      html_content: str,
@@ -53,28 +149,51 @@ class PDFGenerator:
             # Fallback: minimal ReportLab rendering if available
             try:
                 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-                from reportlab.lib.styles import getSampleStyleSheet
                 from reportlab.lib.pagesizes import A4
+                styles = _fallback_styles()
             except Exception:
                 self.logger.error("WeasyPrint not available and ReportLab fallback missing.")
                 return False
 
-            styles = getSampleStyleSheet()
-            doc = SimpleDocTemplate(output_path, pagesize=A4)
+            # Built in memory and written out in one go rather than through
+            # ReportLab's own small-block file writes
+            buf = BytesIO()
+            doc = SimpleDocTemplate(buf, pagesize=A4)
             story = []
-            soup = BeautifulSoup(html_content, 'html.parser')
+            soup = self._parsed_soup(html_content)
             t = soup.find('title')
             text_title = (t.get_text().strip() if t else (title or "Archived Page"))
-            story.append(Paragraph(text_title, styles['Title']))
+            story.append(Paragraph(_escape_html(text_title), styles['Title']))
             story.append(Spacer(1, 12))
-            # Add paragraphs for each <p>
-            for p in soup.find_all('p'):
-                txt = p.get_text().strip()
+            # One walk over the body in document order; block elements are
+            # looked up in the table and not descended into. lxml already
+            # lowercases tag names, and text nodes have name None.
+            body = soup.find('body') or soup
+            stack = list(reversed(body.contents))
+            while stack:
+                el = stack.pop()
+                name = el.name
+                if name is None:
+                    continue
+                block = _FALLBACK_BLOCKS.get(name)
+                if block is None:
+                    stack.extend(reversed(el.contents))
+                    continue
+                style, space_after, bullet = block
+                # Most blocks have no inline formatting: one get_text over
+                # the subtree instead of building markup child by child
+                if el.find(_INLINE_TAGS) is None:
+                    txt = _escape_html(el.get_text().strip())
+                else:
+                    txt = _formatted_text(el).strip()
                 if txt:
-                    story.append(Paragraph(txt, styles['Normal']))
-                    story.append(Spacer(1, 6))
+                    story.append(Paragraph(txt, styles[style], bulletText=bullet))
+                    if space_after:
+                        story.append(Spacer(1, space_after))
             doc.build(story)
-            return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+            with open(output_path, 'wb', buffering=1 << 20) as f:
+                f.write(buf.getbuffer())
+            return True
         except Exception as e:
             self.logger.error(f"Failed to generate PDF {output_path}: {e}")
             return False
@@ -83,6 +202,20 @@ class PDFGenerator:
         """No-op for WeasyPrint engine."""
         return None
 
+    def _parsed_soup(self, html_content: str) -> BeautifulSoup:
+        """Parse html_content with lxml (strained), reusing a recent parse of the same page."""
+        key = hashlib.blake2b(html_content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        cache = self._parse_cache
+        soup = cache.get(key)
+        if soup is not None:
+            cache.move_to_end(key)
+            return soup
+        soup = BeautifulSoup(html_content, 'lxml', parse_only=_SOUP_STRAINER)
+        cache[key] = soup
+        if len(cache) > PARSE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return soup
+
     def get_metadata(self, html_content: str) -> Dict[str, Any]:
         """
         Extract metadata from HTML content.
@@ -93,7 +226,7 @@ class PDFGenerator:
         Returns:
             Dictionary with metadata information
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = self._parsed_soup(html_content)
         
         metadata = {
             'title': '',
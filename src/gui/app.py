@@ -153,6 +153,8 @@ class ArchaicApp(tk.Tk):
                 self._queue.put(("done", stats))
             except Exception as e:
                 self._queue.put(("error", str(e)))
+            finally:
+                self._controller.close()
 
         self._worker = threading.Thread(target=run_worker, daemon=True)
         self._worker.start()
@@ -246,7 +248,7 @@ class ArchaicApp(tk.Tk):
         listbox.configure(yscrollcommand=sb.set)
         # Show first 200 entries
         for rec in pages[:200]:
-            listbox.insert(tk.END, rec.get('url', ''))
+            listbox.insert(tk.END, rec.url)
         ttk.Label(win, text="Use 'Max pages' in Advanced to limit processing.").pack(anchor='w', padx=10)
         ttk.Button(win, text="Close", command=win.destroy).pack(pady=8)
 
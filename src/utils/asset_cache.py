@@ -0,0 +1,163 @@
+"""
+Persistent on-disk asset cache shared across runs.
+
+Asset bodies are stored once per original URL (sha1 of the URL plus the URL's
+file extension) and indexed in a small SQLite table so warm runs can place
+assets without touching the network. The index also keeps the validators
+(ETag / Last-Modified) returned with each download.
+
+Identical bodies served under different URLs share storage: each stored file
+is hard-linked to a content-addressed blob (blobs/<xx>/<blake2b digest>).
+Recent lookups are also kept in an in-memory LRU so repeat hits within a run
+skip the SQLite query.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+
+DEFAULT_INDEX_NAME = "index.sqlite3"
+BLOB_DIR_NAME = "blobs"
+MEMORY_CACHE_SIZE = 50_000
+# Read size when hashing a stored file for its content blob
+HASH_CHUNK_SIZE = 256 * 1024
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    url: str
+    path: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class AssetCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index_path = os.path.join(self.cache_dir, DEFAULT_INDEX_NAME)
+        self.blob_dir = os.path.join(self.cache_dir, BLOB_DIR_NAME)
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS assets ("
+                " url TEXT PRIMARY KEY,"
+                " file TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " fetched_at REAL NOT NULL)"
+            )
+
+    def path_for(self, url: str) -> str:
+        """Cache file path for url (whether or not it is cached yet)."""
+        return os.path.join(self.cache_dir, self._file_name(url))
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Return the cache entry for url if its file is present and complete."""
+        with self._lock:
+            entry = self._recent.get(url)
+            if entry is not None:
+                self._recent.move_to_end(url)
+            else:
+                row = self._conn.execute(
+                    "SELECT file, size, etag, last_modified FROM assets WHERE url = ?", (url,)
+                ).fetchone()
+        if entry is not None:
+            try:
+                if os.stat(entry.path).st_size == entry.size:
+                    return entry
+            except OSError:
+                pass
+            with self._lock:
+                self._recent.pop(url, None)
+            return None
+        if row is None:
+            # Files cached before the index existed are adopted as-is
+            path = self.path_for(url)
+            if not os.path.isfile(path):
+                return None
+            return self.store(url, path)
+        file_name, size, etag, last_modified = row
+        path = os.path.join(self.cache_dir, file_name)
+        try:
+            if os.stat(path).st_size != size:
+                return None
+        except OSError:
+            return None
+        entry = CacheEntry(url=url, path=path, size=size, etag=etag, last_modified=last_modified)
+        self._remember(entry)
+        return entry
+
+    def store(self, url: str, path: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> CacheEntry:
+        """Index a file already written to path_for(url)."""
+        self._dedupe(path)
+        size = os.stat(path).st_size
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO assets (url, file, size, etag, last_modified, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, os.path.basename(path), size, etag, last_modified, time.time()),
+            )
+        entry = CacheEntry(url=url, path=path, size=size, etag=etag, last_modified=last_modified)
+        self._remember(entry)
+        return entry
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, entry: CacheEntry) -> None:
+        with self._lock:
+            self._recent[entry.url] = entry
+            self._recent.move_to_end(entry.url)
+            if len(self._recent) > MEMORY_CACHE_SIZE:
+                self._recent.popitem(last=False)
+
+    def _dedupe(self, path: str) -> None:
+        """
+        Hard-link path to its content blob. If a blob with the same digest
+        already exists, path is replaced by a link to it so identical bodies
+        occupy disk once. Filesystems without hard links are left as-is, and
+        a file that cannot be hashed or linked is simply not deduplicated.
+        """
+        try:
+            h = hashlib.blake2b()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            blob = os.path.join(self.blob_dir, digest[:2], digest)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+                return
+            except FileExistsError:
+                pass
+            if os.path.samefile(path, blob):
+                return
+            tmp = f"{path}.{threading.get_ident()}.link"
+            os.link(blob, tmp)
+            try:
+                os.replace(tmp, path)
+            finally:
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+        except OSError:
+            pass
+
+    def _file_name(self, url: str) -> str:
+        h = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        _, ext = os.path.splitext(urlparse(url).path)
+        return h + (ext if ext and len(ext) <= 6 else '')
@@ -33,6 +33,8 @@ class FileManager:
         self.html_dir = self.base_output_dir / "html"
         self.pdf_dir = self.base_output_dir / "pdf"
         self.logger = logging.getLogger(__name__)
+        # Directories already created this run; skips a makedirs per saved page
+        self._ensured_dirs = set()
         
         # Create output directories
         self._create_directories()
@@ -130,13 +132,17 @@ class FileManager:
             html_path, _ = self.get_file_paths(url, timestamp)
             
             # Ensure directory exists
-            os.makedirs(os.path.dirname(html_path), exist_ok=True)
+            self._ensure_dir(os.path.dirname(html_path))
             
-            # Save the HTML content
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            # Encode once and hand the whole document to a single unbuffered
+            # write; no fsync, the manifest flush is the durability point
+            data = html_content.encode('utf-8')
+            with open(html_path, 'wb', buffering=0) as f:
+                view = memoryview(data)
+                while view:
+                    view = view[f.write(view):]
             
-            file_size = os.path.getsize(html_path)
+            file_size = len(data)
             self.logger.info(f"Saved HTML ({file_size} bytes): {os.path.basename(html_path)}")
             
             return html_path
@@ -145,6 +151,12 @@ class FileManager:
             self.logger.error(f"Failed to save HTML for {url}: {e}")
             return None
     
+    def _ensure_dir(self, path: str) -> None:
+        """Create path once per run; later calls for the same directory are free."""
+        if path not in self._ensured_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._ensured_dirs.add(path)
+    
     def file_exists(self, url: str, timestamp: str = None, file_type: str = 'both') -> Dict[str, bool]:
         """
         Check if files already exist for a given URL.
@@ -0,0 +1,67 @@
+"""
+Shared HTTP session factory.
+
+One pooled requests.Session is created per run and handed to the CDX client,
+HTML retriever and asset downloader so all Wayback traffic reuses the same
+keep-alive connections instead of each component opening its own pool.
+"""
+
+import codecs
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+
+# Connections kept alive per host; Wayback traffic is almost all one host
+DEFAULT_POOL_SIZE = 16
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_BOMS = ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+
+
+def create_session(pool_maxsize: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Build a keep-alive session with a connection pool sized for pool_maxsize
+    concurrent requests. The pool blocks when every connection is in use, so
+    a burst beyond pool_maxsize waits for a warm connection instead of
+    opening (and then discarding) an extra one with a fresh TLS handshake.
+
+    Accept-Encoding advertises whatever urllib3 can decode here (brotli is
+    included when the brotli package is installed).
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_maxsize), pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'Accept-Encoding': DEFAULT_ACCEPT_ENCODING,
+        'Connection': 'keep-alive',
+    })
+    return session
+
+
+def detect_html_encoding(content_type: str, body: bytes) -> str:
+    """
+    Pick the charset for an HTML body: a byte-order mark, else the
+    Content-Type charset, else a <meta charset> near the top of the
+    document, else UTF-8. Only the start of body is examined, so the whole
+    document is never run through charset detection (as Response.text does).
+    """
+    for bom, name in _BOMS:
+        if body.startswith(bom):
+            return name
+    m = _CHARSET_RE.search(content_type or '')
+    if m is None:
+        m = _META_CHARSET_RE.search(body, 0, 4096)
+    if m is not None:
+        name = m.group(1)
+        if isinstance(name, bytes):
+            name = name.decode('ascii', 'ignore')
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            pass
+    return 'utf-8'
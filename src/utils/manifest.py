@@ -4,13 +4,19 @@ Stores an append-only JSON Lines file with one record per processed URL.
 """
 
 import json
+import logging
 import os
+import queue
+import threading
 import time
 from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, Iterable
+from typing import Optional, Dict, Any, Iterable, List
 
 
 DEFAULT_MANIFEST_NAME = "manifest.jsonl"
+# ManifestWriter flushes after this many records or this many seconds
+WRITER_BATCH_SIZE = 100
+WRITER_FLUSH_INTERVAL = 0.05
 
 
 @dataclass
@@ -34,8 +40,16 @@ class Manifest:
         self.path = os.path.join(self.output_dir, DEFAULT_MANIFEST_NAME)
 
     def append(self, rec: ManifestRecord) -> None:
+        self.append_many([rec])
+
+    def append_many(self, recs: List[ManifestRecord], fsync: bool = False) -> None:
+        """Append records with a single write (optionally fsynced)."""
+        data = "".join(json.dumps(asdict(rec), ensure_ascii=False) + "\n" for rec in recs)
         with open(self.path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(asdict(rec), ensure_ascii=False) + "\n")
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
 
     def iter_records(self) -> Iterable[Dict[str, Any]]:
         if not os.path.exists(self.path):
@@ -72,3 +86,57 @@ class Manifest:
         completed = {k for k, v in latest.items() if v == 'completed'}
         failed = {k for k, v in latest.items() if v == 'failed'}
         return completed, failed
+
+
+class ManifestWriter:
+    """
+    Single background writer for a Manifest.
+
+    Worker threads put() records without taking a lock; the writer drains
+    the queue and appends in batches (up to WRITER_BATCH_SIZE records or
+    WRITER_FLUSH_INTERVAL seconds), with one fsync per batch. close()
+    flushes everything queued and joins the thread.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, manifest: Manifest):
+        self.manifest = manifest
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="manifest-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, rec: ManifestRecord) -> None:
+        self._queue.put(rec)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(self._CLOSE)
+            self._thread.join()
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is self._CLOSE:
+                break
+            batch = [item]
+            deadline = time.monotonic() + WRITER_FLUSH_INTERVAL
+            while len(batch) < WRITER_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self._CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                self.manifest.append_many(batch, fsync=True)
+            except OSError as e:
+                # A failed batch must not kill the writer; these pages are
+                # just not marked for resume
+                logging.getLogger(__name__).error(f"Failed to write {len(batch)} manifest records: {e}")
@@ -18,31 +18,30 @@ class TokenBucket:
             rate_per_sec: average tokens per second (e.g., 0.66 ≈ 1 token/1.5s)
             burst: bucket capacity
             jitter_ms: random jitter added after acquire to avoid lockstep
+
+        Each acquire reserves the next free slot on a monotonic schedule
+        under the lock and then sleeps outside it until that slot, so
+        waiting threads are served in arrival order without polling.
         """
         self.rate = rate_per_sec
         self.capacity = burst
-        self.tokens = burst
-        self.last = time.monotonic()
+        self.interval = 1.0 / rate_per_sec
+        # Slots may run this far ahead of real time (the burst allowance)
+        self.tolerance = (max(1, burst) - 1) * self.interval
+        # Theoretical time of the next slot once the bucket is drained
+        self.next_slot = time.monotonic()
         self.lock = threading.Lock()
         self.jitter_ms = jitter_ms
 
     def acquire(self):
-        while True:
-            with self.lock:
-                now = time.monotonic()
-                elapsed = now - self.last
-                # Refill
-                self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
-                if self.tokens >= 1:
-                    self.tokens -= 1
-                    self.last = now
-                    break
-                # Compute wait for next token
-                needed = 1 - self.tokens
-                wait = max(needed / self.rate, 0.01)
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+            wait = slot - self.tolerance - now
+        if wait > 0:
             time.sleep(wait)
 
         # Apply small jitter outside lock
         if self.jitter_ms > 0:
             time.sleep(random.uniform(0, self.jitter_ms) / 1000.0)
-
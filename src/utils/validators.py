@@ -6,6 +6,7 @@ for the Archaic web scraper.
 """
 
 import re
+from functools import lru_cache
 from urllib.parse import urlparse, urlunparse
 from typing import Tuple, Optional
 import logging
@@ -217,11 +218,15 @@ def validate_url(url: str) -> Tuple[bool, str, str]:
     return get_validator().validate_and_normalize(url)
 
 
+@lru_cache(maxsize=100_000)
 def normalize_host(url: str) -> Tuple[bool, str, str]:
     """
     Normalize scheme/host for deduplication:
     - Lowercase scheme/host, strip leading 'www.'
     - Remove default ports 80/443
+
+    Pure function of url, so results are memoized: CDX merging, resume
+    filtering and page processing all normalize the same URLs.
     """
     try:
         ok, normalized, err = validate_url(url)
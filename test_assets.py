@@ -3,14 +3,20 @@
 Focused tests for asset rewriting without network.
 """
 
+import io
+import os
 import sys
+import tempfile
+import threading
+import time
 from pathlib import Path
+from urllib.parse import urljoin
 
 # Add the src directory to the path
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-from core.assets import AssetRewriter
+from core.assets import Asset, AssetCollector, AssetDownloader, AssetRewriter, ref_resolver
 
 
 def test_html_rewrite_basic():
@@ -18,12 +24,16 @@ def test_html_rewrite_basic():
     <link rel="stylesheet" href="/css/site.css">
     <style>div{background:url('/img/bg.png')}</style>
     </head><body>
-    <img src="https://example.com/img/logo.png">
+    <div style='background:url("/img/bg.png?v=1&amp;w=2")'></div>
+    <img src="https://example.com/img/logo.png" srcset="https://example.com/img/logo.png 1x, /img/logo-2x.png 2x">
+    <pre>.x{background:url(https://example.com/img/logo.png)}</pre>
+    <script>var css = "url(/img/bg.png)";</script>
     </body></html>'''
     mapping = {
         'https://example.com/img/logo.png': '/abs/output/html/assets/page/img/logo.png',
         '/css/site.css': '/abs/output/html/assets/page/css/site.css',
         '/img/bg.png': '/abs/output/html/assets/page/img/bg.png',
+        '/img/bg.png?v=1&w=2': '/abs/output/html/assets/page/img/bg2.png',
     }
     html_dir = '/abs/output/html'
     r = AssetRewriter()
@@ -31,9 +41,179 @@ def test_html_rewrite_basic():
     assert 'src="assets/page/img/logo.png"' in rewritten
     assert 'href="assets/page/css/site.css"' in rewritten
     assert "url(assets/page/img/bg.png)" in rewritten
+    assert "url(assets/page/img/bg2.png)" in rewritten
+    assert 'srcset="assets/page/img/logo.png 1x, /img/logo-2x.png 2x"' in rewritten
+    # url(...) outside <style> and style attributes is page text, not CSS
+    assert '<pre>.x{background:url(https://example.com/img/logo.png)}</pre>' in rewritten
+    assert 'var css = "url(/img/bg.png)";' in rewritten
+
+
+def test_embed_single_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        img = Path(tmp) / 'logo.png'
+        img.write_bytes(b'\x89PNG\r\n')
+        (Path(tmp) / 'empty.gif').write_bytes(b'')
+        html = '<html><body><img src="logo.png"><img src="empty.gif"><img src="gone.png"></body></html>'
+        out = AssetRewriter().embed_single_file(html, {}, tmp)
+        assert 'src="data:image/png;base64,iVBORw0K"' in out
+        assert 'src="data:image/gif;base64,"' in out
+        assert 'src="gone.png"' in out
+
+
+def test_css_dependencies():
+    css = "@import url('base.css');\n.a{background:URL(\"../img/a.png\")}\n.b{background:url(data:image/png;base64,AAAA)}"
+    deps = AssetRewriter().extract_css_dependencies(css)
+    assert set(deps) == {'base.css', '../img/a.png'}
+
+    # Relative, root-relative and absolute refs all resolve against the
+    # stylesheet URL and are rewritten relative to the stylesheet's directory
+    css = ".a{background:url(../img/a.png)} .b{background:url('/img/b.png')} .c{background:url(https://cdn.example.com/c.png)}"
+    mapping = {
+        'https://example.com/img/a.png': '/out/html/assets/p/img/a.png',
+        'https://example.com/img/b.png': '/out/html/assets/p/img/b.png',
+    }
+    out = AssetRewriter().localize_css(css, 'https://example.com/css/site.css', mapping, '/out/html/assets/p/css')
+    assert 'url(../img/a.png)' in out and 'url(../img/b.png)' in out
+    assert 'url(https://cdn.example.com/c.png)' in out
+    # Stylesheets read from disk are handled as bytes end to end
+    assert set(AssetRewriter().extract_css_dependencies(css.encode())) == {
+        '../img/a.png', '/img/b.png', 'https://cdn.example.com/c.png'}
+    assert AssetRewriter().localize_css(css.encode(), 'https://example.com/css/site.css', mapping,
+                                        '/out/html/assets/p/css') == out.encode()
+
+
+def test_ref_resolver_matches_urljoin():
+    refs = ['../img/a.png', 'img/a.png', '/img/a.png', '//cdn.example.com/a.png', 'https://cdn.example.com/a.png',
+            'data:image/png;base64,AA', './a.png', 'a.png?x=1#y', '?q', '#f', '', 'img/./a.png', 'https:foo']
+    for base in ['https://example.com/css/site.css', 'http://example.com/a/b.css?v=1', 'https://example.com']:
+        resolve = ref_resolver(base)
+        for ref in refs:
+            assert resolve(ref) == urljoin(base, ref), (base, ref)
+
+
+def test_collect_single_pass():
+    html = '''<?xml version="1.0" encoding="utf-8"?><html><head>
+    <link rel="Stylesheet" href="/css/site.css">
+    <link rel="preload" as="font" href="/fonts/a.woff2">
+    <style>@import "/css/extra.css"; h1{background:url('/img/h1.png')}</style>
+    </head><body>
+    <!-- comment -->
+    <img src="/img/logo.png" srcset="/img/logo-2x.png 2x, data:image/png;base64,AAAA 3x">
+    <picture><source srcset="/img/wide.png 800w"></picture>
+    <div style="background-image:url(/img/bg.png)"></div>
+    <img src="/img/logo.png">
+    </body></html>'''
+    assets = AssetCollector().collect(html, 'https://example.com/page')
+    by_url = {a.url: a for a in assets}
+    assert len(assets) == len(by_url) == 8
+    assert by_url['https://example.com/css/site.css'].type == 'stylesheet'
+    assert by_url['https://example.com/fonts/a.woff2'].type == 'other'
+    assert by_url['https://example.com/img/logo-2x.png'].attr == 'srcset'
+    assert by_url['https://example.com/img/bg.png'].attr == 'style'
+    assert 'https://example.com/css/extra.css' in by_url
+    assert AssetCollector().collect('', 'https://example.com/') == []
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes):
+        self.raw = io.BytesIO(body)
+        self.headers = {'ETag': '"abc"'}
+        self.status_code = 200
+
+    def raise_for_status(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    def __init__(self):
+        self.requested = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requested.append(url)
+        if url.endswith('/missing.png'):
+            raise IOError("404")
+        resp = _FakeResponse(url.encode('utf-8'))
+        if headers and headers.get('If-None-Match') == '"abc"':
+            resp.status_code = 304
+            resp.raw = io.BytesIO(b'')
+        return resp
+
+
+def test_download_pool():
+    assets = [Asset(url=f"https://example.com/img/{i}.png", type='image', attr='src') for i in range(12)]
+    assets.append(Asset(url="https://example.com/img/missing.png", type='image', attr='src'))
+    with tempfile.TemporaryDirectory() as tmp:
+        d = AssetDownloader(cache_dir=str(Path(tmp) / 'cache'), max_workers=4)
+        d.session = _FakeSession()
+        mapping = d.download(assets, str(Path(tmp) / 'assets'), '20230515120000')
+        assert len(d.session.requested) == 13
+        assert len(mapping) == 12
+        assert "https://example.com/img/missing.png" not in mapping
+        local = mapping["https://example.com/img/3.png"]
+        assert Path(local).read_bytes().endswith(b"https://example.com/img/3.png")
+        assert not list((Path(tmp) / 'cache').glob('*.part'))
+
+        # A warm cache places assets without any request
+        d2 = AssetDownloader(cache_dir=str(Path(tmp) / 'cache'), max_workers=4)
+        d2.session = _FakeSession()
+        mapping2 = d2.download(assets, str(Path(tmp) / 'assets2'), '20230515120000')
+        assert d2.session.requested == ["https://web.archive.org/web/20230515120000if_/https://example.com/img/missing.png"]
+        assert len(mapping2) == 12
+        assert Path(mapping2["https://example.com/img/3.png"]).read_bytes() == Path(local).read_bytes()
+
+        # Revalidation sends the stored ETag and keeps the entry on 304
+        d3 = AssetDownloader(cache_dir=str(Path(tmp) / 'cache'), max_workers=4, revalidate=True)
+        d3.session = _FakeSession()
+        mapping3 = d3.download(assets, str(Path(tmp) / 'assets3'), '20230515120000')
+        assert len(d3.session.requested) == 13
+        assert Path(mapping3["https://example.com/img/3.png"]).read_bytes() == Path(local).read_bytes()
+
+        # Without a cache the streamed temp file is moved into place
+        d = AssetDownloader(cache_dir=None, max_workers=2)
+        d.session = _FakeSession()
+        mapping = d.download(assets[:2], str(Path(tmp) / 'nocache'), '20230515120000')
+        assert sorted(Path(p).name for p in mapping.values()) == ['0.png', '1.png']
+
+
+class _SameBodySession(_FakeSession):
+    def get(self, url, headers=None, **kwargs):
+        self.requested.append(url)
+        time.sleep(0.01)
+        return _FakeResponse(b"identical body")
+
+
+def test_shared_assets_across_pages():
+    assets = [Asset(url=f"https://example.com/img/{i}.png", type='image', attr='src') for i in range(4)]
+    with tempfile.TemporaryDirectory() as tmp:
+        d = AssetDownloader(cache_dir=str(Path(tmp) / 'cache'), max_workers=4)
+        d.session = _SameBodySession()
+        # Two pages needing the same assets at once: each URL is fetched once
+        pages = [threading.Thread(target=d.download, args=(assets, str(Path(tmp) / f'page{n}'), '20230515120000'))
+                 for n in range(2)]
+        for t in pages:
+            t.start()
+        for t in pages:
+            t.join()
+        assert len(d.session.requested) == 4
+        assert len(list((Path(tmp) / 'page1' / 'img').iterdir())) == 4
+        # Identical bodies under different URLs share one inode in the cache
+        inodes = {os.stat(d.cache.lookup(a.url).path).st_ino for a in assets}
+        assert len(inodes) == 1
 
 
 if __name__ == "__main__":
     test_html_rewrite_basic()
+    test_embed_single_file()
+    test_css_dependencies()
+    test_ref_resolver_matches_urljoin()
+    test_collect_single_pass()
+    test_download_pool()
+    test_shared_assets_across_pages()
     print("✓ asset rewrite tests passed")
 
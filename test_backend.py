@@ -49,6 +49,47 @@ def test_logging_system():
     return True
 
 
+def test_error_tracker_flushes_on_timer():
+    """Buffered error records reach the log on their own, one line each."""
+    print("🔍 Testing ErrorTracker batch flushing...")
+
+    import logging
+    import time
+    import core.logger as logger_module
+    from core.logger import ErrorTracker
+
+    lines = []
+
+    class ListHandler(logging.Handler):
+        def emit(self, record):
+            lines.append(record.getMessage())
+
+    log = logging.getLogger('test.error_tracker_timer')
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    handler = ListHandler()
+    log.addHandler(handler)
+    interval = logger_module.ERROR_FLUSH_INTERVAL
+    logger_module.ERROR_FLUSH_INTERVAL = 0.2
+    try:
+        tracker = ErrorTracker(log)
+        tracker.log_error(ValueError("first"))   # written at once
+        tracker.log_error(ValueError("second"))  # buffered
+        tracker.log_warning("third")
+        assert len(lines) == 1, lines
+        deadline = time.monotonic() + 5
+        while len(lines) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert len(lines) == 3, lines
+        assert all(line.startswith(('[ERR_', '[WARN_')) and '\n' not in line for line in lines), lines
+    finally:
+        logger_module.ERROR_FLUSH_INTERVAL = interval
+        log.removeHandler(handler)
+
+    print("   ✓ Pending records written by the flush timer")
+    return True
+
+
 def test_url_validation():
     """Test URL validation."""
     print("🔍 Testing URL Validation...")
@@ -145,6 +186,125 @@ def test_cdx_client():
         return False
 
 
+def test_cdx_latest_across_host_patterns():
+    """The same URL under the bare and www host patterns resolves to its newest capture."""
+    print("🔍 Testing CDX merge across host patterns...")
+
+    import tempfile
+    import time
+    from core.cdx_client import CDXRecord
+
+    def rec(url, ts):
+        return CDXRecord(url, ts, f"https://web.archive.org/web/{ts}/{url}")
+
+    pages = {
+        # The www pattern answers first and holds the older capture of a1
+        'http*://www.example.com/articles/*': [
+            [rec('https://www.example.com/articles/a1', '20200101000000')],
+            [rec('https://www.example.com/articles/a2', '20230101000000')],
+        ],
+        'http*://example.com/articles/*': [
+            [rec('https://example.com/articles/a1', '20220101000000')],
+            [rec('https://example.com/articles/a2', '20210101000000')],
+        ],
+    }
+
+    def fake_pages(pattern, base_params):
+        if not pattern.startswith('http*://www.'):
+            time.sleep(0.05)
+        yield from pages[pattern]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = CDXClient(request_delay=0, cache_dir=cache_dir)
+        client._iter_pattern_pages = fake_pages
+        try:
+            latest = {r.url.replace('www.', ''): r.timestamp for r in client.discover_urls('example.com/articles/')}
+            expected = {
+                'https://example.com/articles/a1': '20220101000000',
+                'https://example.com/articles/a2': '20230101000000',
+            }
+            assert latest == expected, latest
+
+            # A later run served from the discovery cache sees the same captures
+            client._iter_pattern_pages = None
+            cached = {r.url.replace('www.', ''): r.timestamp for r in client.discover_urls('example.com/articles/')}
+            assert cached == expected, cached
+        finally:
+            client.close()
+
+    print("   ✓ Newest capture kept per normalized URL")
+    return True
+
+
+def test_cdx_paging_strategies():
+    """One request for a single page; numbered pages or resumeKey beyond that."""
+    print("🔍 Testing CDX paging strategies...")
+
+    import requests
+
+    class FakeResponse:
+        def __init__(self, body):
+            self.text = body
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def iter_lines(self):
+            return iter(self.text.encode('utf-8').split(b'\n'))
+
+    def rows(*names):
+        return ''.join(f"2020010100000{i} https://example.com/{n}\n" for i, n in enumerate(names))
+
+    def run(num_pages):
+        """Page one pattern against a fake CDX; returns (urls, requests made)."""
+        calls = []
+
+        def fake_request(params, stream=False):
+            calls.append(params)
+            if 'showNumPages' in params:
+                if num_pages is None:
+                    raise requests.HTTPError("page count not supported")
+                return FakeResponse(str(num_pages))
+            if 'page' in params:
+                return FakeResponse(rows(f"p{params['page']}a", f"p{params['page']}b"))
+            if params.get('resumeKey') == 'key1':
+                return FakeResponse(rows('r2'))
+            if single_page:
+                return FakeResponse(rows('only'))
+            return FakeResponse(rows('r1') + "\nkey1\n")
+
+        client = CDXClient(request_delay=0)
+        client._make_request = fake_request
+        try:
+            found = client._page_pattern('http*://example.com/*', client._discovery_params())
+        finally:
+            client.close()
+        return sorted(rec.url.rsplit('/', 1)[1] for rec in found.values()), calls
+
+    # Everything fits in the first page: no page count is asked for
+    single_page = True
+    urls, calls = run(num_pages=3)
+    assert urls == ['only'] and len(calls) == 1, calls
+
+    # More results and a known page count: numbered pages, fetched in full
+    single_page = False
+    urls, calls = run(num_pages=3)
+    assert urls == ['p0a', 'p0b', 'p1a', 'p1b', 'p2a', 'p2b'], urls
+    assert sorted(c['page'] for c in calls if 'page' in c) == [0, 1, 2]
+    assert all('limit' not in c for c in calls if 'page' in c)
+
+    # No page count available: resumeKey paging carries on from the first page
+    urls, calls = run(num_pages=None)
+    assert urls == ['r1', 'r2'], urls
+    assert [c.get('resumeKey') for c in calls if 'showNumPages' not in c] == [None, 'key1']
+
+    print("   ✓ Paging strategy chosen from the first response")
+    return True
+
+
 def test_html_cleaner():
     """Test the HTML cleaner with sample Wayback Machine content."""
     print("🔍 Testing HTML Cleaner...")
@@ -180,8 +340,9 @@ def test_html_cleaner():
     </html>
     """
     
-    # Clean the HTML
-    cleaned_html = cleaner.clean_html(test_html, "https://example.com/test")
+    # Clean the HTML, keeping the element counts taken during the same pass
+    result = cleaner.clean_html_with_counts(test_html, "https://example.com/test")
+    cleaned_html = result['cleaned_html'] if result else None
     
     if cleaned_html:
         # Check that Wayback elements were removed
@@ -197,6 +358,14 @@ def test_html_cleaner():
             print("   ✗ Original content may have been lost")
             return False
         
+        # Validation reuses the counts instead of re-scanning the original
+        validation = cleaner.validate_cleaned_content(result)
+        if validation.get('preservation_ratios', {}).get('headings') == 1.0:
+            print("   ✓ Headings preserved")
+        else:
+            print("   ✗ Validation reported lost headings")
+            return False
+        
         print(f"   ✓ HTML cleaned (original: {len(test_html)}, cleaned: {len(cleaned_html)} chars)")
         print("   ✓ HTML cleaner working correctly")
         return True
@@ -371,9 +540,12 @@ def main():
     
     tests = [
         ("Logging System", test_logging_system),
+        ("Error Tracker Flush", test_error_tracker_flushes_on_timer),
         ("URL Validation", test_url_validation),
         ("File Manager", test_file_manager),
         ("CDX Client", test_cdx_client),
+        ("CDX Host Patterns", test_cdx_latest_across_host_patterns),
+        ("CDX Paging", test_cdx_paging_strategies),
         ("HTML Cleaner", test_html_cleaner),
         ("PDF Generator", test_pdf_generator),
         ("Integration Test", run_integration_test)